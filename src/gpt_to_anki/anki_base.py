@@ -10,4 +10,7 @@ class AbstractAnkiDeck(ABC):
         self, database_ids: List[int]
     ) -> List[AnkiNoteFeedback]:
         """Fetch latest Anki-side note fields and card state for given database ids."""
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    async def awarmup(self) -> None:
+        """Prepare the connection to Anki ahead of the first fetch, if useful."""
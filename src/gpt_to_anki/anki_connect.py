@@ -1,11 +1,45 @@
 import asyncio
-from typing import Dict, List, Optional
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 import aiohttp
+import orjson
 
 from gpt_to_anki.anki_base import AbstractAnkiDeck
 from gpt_to_anki.anki_models import AnkiNoteFeedback
 
+LOG = logging.getLogger(__name__)
+
+# AnkiConnect API version sent with every action
+API_VERSION = 6
+
+# Number of ids OR-ed into one search, keeps query strings reasonably short
+SEARCH_CHUNK_SIZE = 500
+
+# Seconds an idle connection to Anki is kept open, and allowed for connecting
+CONNECTION_KEEPALIVE = 30.0
+CONNECT_TIMEOUT = 2.0
+
+# Sends one AnkiConnect request payload and returns the decoded reply
+Transport = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+# Tries per request when AnkiConnect can't be reached, waiting
+# POST_RETRY_DELAY seconds before the first retry and doubling after that
+POST_ATTEMPTS = 4
+POST_RETRY_DELAY = 0.25
+
+# Anki's card flags, searchable as flag:1 .. flag:7
+CARD_FLAGS = range(1, 8)
+
+# Note type field names tried, in order, when no field map is given
+FIELD_CANDIDATES = {
+    "question": ("Question", "Front"),
+    "answer": ("Answer", "Back"),
+    "topic": ("Topic",),
+}
+
 
 class AnkiConnectDeck(AbstractAnkiDeck):
     def __init__(
@@ -15,27 +49,61 @@ class AnkiConnectDeck(AbstractAnkiDeck):
         id_field: str = "id",
         field_map: Optional[Dict[str, str]] = None,
         endpoint: str = "http://127.0.0.1:8765",
+        cache_ttl: float = 30.0,
+        cache_max_entries: int = 10_000,
+        session: Optional[aiohttp.ClientSession] = None,
+        transport: Optional[Transport] = None,
+        connector_limit: int = 16,
+        timeout: float = 30.0,
     ) -> None:
         self.deck_name = deck_name
         self.model_name = model_name
         self.id_field = id_field
+        # Search scope shared by every query: deck and note type
+        self._query_scope = f'deck:"{deck_name}" note:"{model_name}"'
         self.field_map = field_map or {
-            "question": "Question",
-            "answer": "Answer",
-            "topic": "Topic",
+            key: names[0] for key, names in FIELD_CANDIDATES.items()
         }
+        # A user-provided field map is used as is, the default one is checked
+        # against the note type's fields on first use
+        self._field_map_resolved = field_map is not None
+        self._set_field_names()
         self.endpoint = endpoint
-        self._session: Optional[aiohttp.ClientSession] = None
+        self.cache_ttl = cache_ttl
+        self.cache_max_entries = cache_max_entries
+        self.connector_limit = connector_limit
+        self.timeout = timeout
+        # A session passed in belongs to the caller and is left open by close()
+        self._session: Optional[aiohttp.ClientSession] = session
+        self._owns_session = session is None
+        # Replaces HTTP entirely when set: gets each request payload and
+        # returns AnkiConnect's reply, e.g. an in-process fake in tests
+        self._transport = transport
+        # database id -> (fetched at, feedback or None if not in Anki), reused
+        # until cache_ttl expires. Kept oldest first, at most cache_max_entries.
+        self._cache: Dict[int, Tuple[float, Optional[AnkiNoteFeedback]]] = {}
 
     async def _ensure_session(self) -> aiohttp.ClientSession:
         """Ensure we have an active aiohttp session."""
         if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession()
+            # Bounded keep-alive pool, so requests reuse connections to Anki
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit_per_host=self.connector_limit,
+                    keepalive_timeout=CONNECTION_KEEPALIVE,
+                ),
+                # Anki is local: fail fast when it isn't listening
+                timeout=aiohttp.ClientTimeout(
+                    total=self.timeout, connect=CONNECT_TIMEOUT
+                ),
+                json_serialize=lambda obj: orjson.dumps(obj).decode(),
+            )
+            self._owns_session = True
         return self._session
 
     async def close(self) -> None:
-        """Close the aiohttp session."""
-        if self._session and not self._session.closed:
+        """Close the aiohttp session, unless it was passed in."""
+        if self._owns_session and self._session and not self._session.closed:
             await self._session.close()
 
     async def __aenter__(self):
@@ -48,64 +116,106 @@ class AnkiConnectDeck(AbstractAnkiDeck):
         await self.close()
 
     async def _post(self, action: str, **params):
+        payload = self._action(action, **params)
+        if self._transport is not None:
+            data = await self._transport(payload)
+        else:
+            data = await self._send(payload)
+
+        if data.get("error"):
+            raise RuntimeError(f"AnkiConnect error: {data['error']}")
+        return data.get("result")
+
+    async def _send(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """POST a payload to AnkiConnect and return the decoded reply."""
         session = await self._ensure_session()
-        payload = {"action": action, "version": 6, "params": params}
-        
-        async with session.post(self.endpoint, json=payload, timeout=aiohttp.ClientTimeout(total=30)) as response:
-            response.raise_for_status()
-            data = await response.json()
-            if data.get("error"):
-                raise RuntimeError(f"AnkiConnect error: {data['error']}")
-            return data.get("result")
-
-    def _build_search_for_id(self, db_id: int) -> str:
-        # Restrict by deck, note type and match the id field
-        return f'deck:"{self.deck_name}" note:"{self.model_name}" {self.id_field}:{db_id}'
+        attempt = 0
+        while True:
+            try:
+                async with session.post(self.endpoint, json=payload) as response:
+                    response.raise_for_status()
+                    # AnkiConnect answers with Content-Type text/json
+                    return await response.json(loads=orjson.loads, content_type=None)
+            except aiohttp.ClientConnectionError as e:
+                # Anki starting up or dropping a keep-alive connection, every
+                # action used here is a read and safe to send again. Connect
+                # and read timeouts are ClientConnectionErrors too; a bare
+                # asyncio.TimeoutError means the whole request budget is spent,
+                # and retrying it would only multiply the wait.
+                attempt += 1
+                if attempt == POST_ATTEMPTS:
+                    raise
+                delay = POST_RETRY_DELAY * 2 ** (attempt - 1)
+                LOG.debug("AnkiConnect unreachable (%s), retrying in %.2fs", e, delay)
+                await asyncio.sleep(delay)
 
-    async def _fetch_single_feedback(self, db_id: int) -> Optional[AnkiNoteFeedback]:
-        query = self._build_search_for_id(db_id)
+    async def awarmup(self) -> None:
+        """Open the keep-alive connection with a cheap `version` request."""
+        try:
+            await self._post("version")
+        except (RuntimeError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # The fetch that follows reports the failure if it persists
+            LOG.debug("AnkiConnect warmup failed: %s", e)
 
-        note_ids = await self._post("findNotes", query=query) or []
-        if not note_ids:
-            return None
+    @staticmethod
+    def _action(action: str, **params) -> Dict[str, Any]:
+        return {"action": action, "version": API_VERSION, "params": params}
 
-        # Take first note (should be unique by id field)
-        notes = await self._post("notesInfo", notes=note_ids) or []
-        if not notes:
+    async def _post_multi(self, actions: List[Dict[str, Any]]) -> List[Any]:
+        """Run several actions in one request using AnkiConnect's `multi` action."""
+        if not actions:
+            return []
+
+        replies = await self._post("multi", actions=actions) or []
+        results = []
+        for reply in replies:
+            # Versioned sub-actions reply with their own result/error envelope
+            if reply.get("error"):
+                raise RuntimeError(f"AnkiConnect error: {reply['error']}")
+            results.append(reply.get("result"))
+        return results
+
+    def _resolve_field_map(self, field_names: List[str]) -> None:
+        by_lower = {name.lower(): name for name in field_names}
+        for key, candidates in FIELD_CANDIDATES.items():
+            for candidate in candidates:
+                if candidate.lower() in by_lower:
+                    self.field_map[key] = by_lower[candidate.lower()]
+                    break
+        self._field_map_resolved = True
+        self._set_field_names()
+
+    def _set_field_names(self) -> None:
+        # Note field names read for every note, looked up once per field map
+        self._question_field, self._answer_field, self._topic_field = (
+            self.field_map.get(key, key) for key in ("question", "answer", "topic")
+        )
+
+    def _build_search_for_ids(self, db_ids: List[int]) -> str:
+        # Restrict by deck and note type, matching the id field to any of the ids
+        terms = " OR ".join(f"{self.id_field}:{db_id}" for db_id in db_ids)
+        return f"{self._query_scope} ({terms})"
+
+    def _note_database_id(self, note: Dict[str, Any]) -> Optional[int]:
+        value_obj = note.get("fields", {}).get(self.id_field) or {}
+        try:
+            return int(str(value_obj.get("value", "")).strip())
+        except ValueError:
             return None
 
-        note = notes[0]
+    def _to_feedback(
+        self, db_id: int, note: Dict[str, Any], suspended: bool, flag: int
+    ) -> AnkiNoteFeedback:
         fields = note.get("fields", {})
-
-        def get_field(key: str) -> str:
-            name = self.field_map.get(key, key)
-            value_obj = fields.get(name) or {}
-            return value_obj.get("value", "")
-
-        # Determine suspended/flag from cards
-        card_ids = await self._post("findCards", query=query) or []
-        suspended = False
-        flag = 0
-        if card_ids:
-            cards = await self._post("cardsInfo", cards=card_ids) or []
-            for card in cards:
-                # Either explicit suspended, or queue == -1
-                if card.get("suspended") or card.get("queue") == -1:
-                    suspended = True
-                try:
-                    flag_value = int(card.get("flags", 0) or 0)
-                except Exception:
-                    flag_value = 0
-                flag = max(flag, flag_value)
-
-        return AnkiNoteFeedback(
+        # Values are already typed by AnkiConnect's JSON, skip validation
+        return AnkiNoteFeedback.model_construct(
             database_id=db_id,
             anki_note_id=note.get("noteId"),
             deck_name=self.deck_name,
             model_name=note.get("modelName", self.model_name),
-            question=get_field("question"),
-            answer=get_field("answer"),
-            topic=get_field("topic"),
+            question=(fields.get(self._question_field) or {}).get("value", ""),
+            answer=(fields.get(self._answer_field) or {}).get("value", ""),
+            topic=(fields.get(self._topic_field) or {}).get("value", ""),
             suspended=suspended,
             flag=flag,
         )
@@ -113,6 +223,130 @@ class AnkiConnectDeck(AbstractAnkiDeck):
     async def aget_feedback_for_database_ids(
         self, database_ids: List[int]
     ) -> List[AnkiNoteFeedback]:
-        tasks = [self._fetch_single_feedback(db_id) for db_id in database_ids]
-        results = await asyncio.gather(*tasks)
-        return [r for r in results if r is not None]
\ No newline at end of file
+        if not database_ids:
+            return []
+        # Each id is searched for and returned once, in first-seen order
+        database_ids = list(dict.fromkeys(database_ids))
+
+        now = time.monotonic()
+        found: Dict[int, AnkiNoteFeedback] = {}
+        misses = []
+        for db_id in database_ids:
+            entry = self._cache.get(db_id)
+            if entry is None or now - entry[0] >= self.cache_ttl:
+                misses.append(db_id)
+            elif entry[1] is not None:
+                found[db_id] = entry[1]
+
+        if misses:
+            try:
+                fetched = await self._fetch_batch_feedback(misses)
+            except (RuntimeError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                LOG.error("Error fetching Anki feedback: %s", e)
+                fetched = None
+
+            if fetched is not None:
+                fetched_by_id = {feedback.database_id: feedback for feedback in fetched}
+                for db_id in misses:
+                    # None marks ids known to have no note in Anki
+                    feedback = fetched_by_id.get(db_id)
+                    # Re-inserted so the dict stays in fetch order
+                    self._cache.pop(db_id, None)
+                    self._cache[db_id] = (now, feedback)
+                    if feedback is not None:
+                        found[db_id] = feedback
+                self._prune_cache(time.monotonic())
+
+        return [found[db_id] for db_id in database_ids if db_id in found]
+
+    def _prune_cache(self, now: float) -> None:
+        """Drop expired entries, then the oldest ones beyond cache_max_entries."""
+        stale = []
+        for db_id, (fetched_at, _) in self._cache.items():
+            if now - fetched_at < self.cache_ttl:
+                break
+            stale.append(db_id)
+        excess = len(self._cache) - len(stale) - self.cache_max_entries
+        if excess > 0:
+            stale.extend(itertools.islice(self._cache, len(stale), len(stale) + excess))
+        for db_id in stale:
+            del self._cache[db_id]
+
+    async def _fetch_single_feedback(self, db_id: int) -> Optional[AnkiNoteFeedback]:
+        """Fetch feedback for one id, kept for callers of the per-id API."""
+        feedback = await self._fetch_batch_feedback([db_id])
+        return feedback[0] if feedback else None
+
+    async def _fetch_batch_feedback(
+        self, database_ids: List[int]
+    ) -> List[AnkiNoteFeedback]:
+        """Fetch feedback for many ids with one search per chunk of ids.
+
+        Card state comes from searches filtered by Anki itself
+        (`is:suspended`, `flag:N`), so only note ids travel back for it
+        instead of full cardsInfo records. Both round-trips cost one request
+        regardless of how many ids are asked for.
+        """
+        # First round-trip: matching notes, those with a suspended card and
+        # those with a card of each flag, plus the note type's field names if
+        # the field map is not resolved yet
+        resolve_field_map = not self._field_map_resolved
+        search_actions = []
+        if resolve_field_map:
+            search_actions.append(
+                self._action("modelFieldNames", modelName=self.model_name)
+            )
+        for i in range(0, len(database_ids), SEARCH_CHUNK_SIZE):
+            chunk = database_ids[i : i + SEARCH_CHUNK_SIZE]
+            query = self._build_search_for_ids(chunk)
+            search_actions.append(self._action("findNotes", query=query))
+            search_actions.append(
+                self._action("findNotes", query=f"is:suspended {query}")
+            )
+            search_actions.extend(
+                self._action("findNotes", query=f"flag:{flag} {query}")
+                for flag in CARD_FLAGS
+            )
+        search_results = await self._post_multi(search_actions)
+        if resolve_field_map:
+            self._resolve_field_map(search_results.pop(0) or [])
+
+        stride = 2 + len(CARD_FLAGS)
+        note_ids = list(
+            dict.fromkeys(n for r in search_results[0::stride] for n in r or [])
+        )
+        if not note_ids:
+            return []
+        suspended_note_ids = {n for r in search_results[1::stride] for n in r or []}
+        # Flags ascend, so a note ends up with its highest card flag
+        flag_by_note_id: Dict[int, int] = {}
+        for offset, flag in enumerate(CARD_FLAGS, start=2):
+            for r in search_results[offset::stride]:
+                flag_by_note_id.update((n, flag) for n in r or [])
+
+        # Second round-trip: note fields
+        notes = await self._post("notesInfo", notes=note_ids) or []
+
+        # Route notes back to database ids via the id field, first note wins
+        requested = set(database_ids)
+        note_by_db_id: Dict[int, Dict[str, Any]] = {}
+        for note in notes:
+            db_id = self._note_database_id(note)
+            if db_id in requested and db_id not in note_by_db_id:
+                note_by_db_id[db_id] = note
+
+        results = []
+        for db_id in database_ids:
+            note = note_by_db_id.get(db_id)
+            if note is None:
+                continue
+            note_id = note.get("noteId")
+            results.append(
+                self._to_feedback(
+                    db_id,
+                    note,
+                    note_id in suspended_note_ids,
+                    flag_by_note_id.get(note_id, 0),
+                )
+            )
+        return results
@@ -1,4 +1,4 @@
-from typing import List
+import asyncio
 
 from gpt_to_anki.anki_base import AbstractAnkiDeck
 from gpt_to_anki.database import CardDatabase
@@ -11,17 +11,17 @@ async def sync_feedback_for_context(
 
     Returns number of feedback rows saved.
     """
-    cards = await db.aload_cards(context)
-    if not cards:
-        return 0
-
-    database_ids: List[int] = [c.database_id for c in cards if c.database_id is not None]
+    # Read the ids from SQLite while the connection to Anki is opened
+    database_ids, _ = await asyncio.gather(
+        db.aload_database_ids(context), deck.awarmup()
+    )
     if not database_ids:
         return 0
 
+    # Fetched before the write opens a session, so no transaction waits on Anki
     feedback = await deck.aget_feedback_for_database_ids(database_ids)
     if not feedback:
         return 0
 
-    await db.asave_anki_feedback(feedback)
-    return len(feedback)
\ No newline at end of file
+    stamps = await db.asave_anki_feedback(feedback)
+    return len(stamps)
@@ -1,20 +1,54 @@
 import asyncio
+import contextlib
 from collections import Counter
 import logging
+import hashlib
 import os
-import uuid
-from io import BytesIO
+import tempfile
+import time
+import zlib
 from typing import List, Tuple, Optional, Dict, NamedTuple
-from PyPDF2 import PdfReader
-import requests
+import aiohttp
 import gradio as gr
 
 from gpt_to_anki.cards_generator import CardGenerator
 from gpt_to_anki.database import CardDatabase
 from gpt_to_anki.data_objects import Card
+from gpt_to_anki.pdf_text import extract_pdf_text, shutdown_pdf_pool
 
 LOG = logging.getLogger(__name__)
 
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+UPLOAD_CHUNK_SIZE = 4 << 20
+# Extracted PDF text, zlib-compressed and named by the SHA-256 of the PDF
+TEXT_CACHE_FOLDER = os.path.join("media", ".cache")
+# Entries kept there; the least recently read ones go first
+TEXT_CACHE_MAX_ENTRIES = 128
+# Evaluation writes are held back this long, or until this many are pending
+EVALUATION_FLUSH_DELAY = 0.2
+EVALUATION_FLUSH_MAX = 64
+# A failed evaluation flush is tried again after this long
+EVALUATION_RETRY_DELAY = 5.0
+# Seconds a card must stay on screen before leaving it marks it as seen
+SEEN_MIN_DWELL = 0.5
+
+# Button updates carry no value, so one shared instance of each is enough
+_UPDATE_ON = gr.update(interactive=True)
+_UPDATE_OFF = gr.update(interactive=False)
+# (previous enabled, next enabled) -> previous, next and reset button updates
+_NAV_STATES = {
+    (prev_enabled, next_enabled): (
+        _UPDATE_ON if prev_enabled else _UPDATE_OFF,
+        _UPDATE_ON if next_enabled else _UPDATE_OFF,
+        _UPDATE_ON,
+    )
+    for prev_enabled in (False, True)
+    for next_enabled in (False, True)
+}
+
+# Created on first use, inside the running event loop
+_HTTP: Optional[aiohttp.ClientSession] = None
+
 
 class CardDisplay(NamedTuple):
     """Encapsulates card display information and states"""
@@ -37,9 +71,9 @@ class CardDisplay(NamedTuple):
             "",
             "",
             "",
-            gr.update(interactive=False),
-            gr.update(interactive=False),
-            gr.update(interactive=False),
+            _UPDATE_OFF,
+            _UPDATE_OFF,
+            _UPDATE_OFF,
         )
 
 
@@ -51,17 +85,104 @@ class AppState:
         self.document_url: Optional[str] = None
         self.document_key: Optional[str] = None
         self.cards: List[Card] = []
-        self.card_generator = CardGenerator()
+        self.db = CardDatabase()
+        self.card_generator = CardGenerator(db=self.db)
         self.current_card_index: int = 0
+        # When the current card was first displayed, by time.monotonic()
+        self.card_shown_at: float = 0.0
         self.card_evaluations: Dict[int, str] = {}
-        self.db = CardDatabase()
         self.total_cards: int = 0
+        self.evaluation_counts: Counter = Counter()
+        # Write-behind evaluations, database id -> latest evaluation
+        self._pending_evaluations: Dict[int, str] = {}
+        # The background flusher, at most one at a time
+        self._flush_task: Optional[asyncio.Task] = None
+        # Set when enough evaluations are pending to flush without waiting
+        self._flush_due = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        # Set by aclose, after which no more evaluations are queued
+        self._closing = False
 
     def reset_cards(self):
         """Reset card-related state"""
-        self.cards = []
-        self.current_card_index = 0
-        self.total_cards = 0
+        self.set_cards([])
+
+    def set_cards(self, cards: List[Card]):
+        """Replace the loaded cards and recount their evaluations once"""
+        self.cards = cards
+        self.show_card(0)
+        self.total_cards = len(cards)
+        self.evaluation_counts = Counter(card.evaluation for card in cards)
+
+    def show_card(self, index: int):
+        """Make the card at index the current one"""
+        self.current_card_index = index
+        self.card_shown_at = time.monotonic()
+
+    def set_card_evaluation(self, card: Card, evaluation: str):
+        """Change a card's evaluation, keeping the counts in step"""
+        self.evaluation_counts[card.evaluation] -= 1
+        self.evaluation_counts[evaluation] += 1
+        card.evaluation = evaluation
+
+    def queue_evaluation_write(self, card: Card):
+        """Schedule a card's evaluation to be saved with the next flush"""
+        if card.database_id is None or self._closing:
+            return
+        self._pending_evaluations[card.database_id] = card.evaluation
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._arun_flushes())
+        if len(self._pending_evaluations) >= EVALUATION_FLUSH_MAX:
+            # Cut the running task's wait short instead of racing it
+            self._flush_due.set()
+
+    async def _arun_flushes(self):
+        """The one background flusher: write until nothing is left pending"""
+        delay = EVALUATION_FLUSH_DELAY
+        while self._pending_evaluations:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._flush_due.wait(), delay)
+            self._flush_due.clear()
+            saved = await self.aflush_evaluations()
+            delay = EVALUATION_FLUSH_DELAY if saved else EVALUATION_RETRY_DELAY
+
+    def _requeue_evaluations(self, pending: Dict[int, str]):
+        # Keep them for the next flush, unless superseded meanwhile
+        for card_id, evaluation in pending.items():
+            self._pending_evaluations.setdefault(card_id, evaluation)
+
+    async def aflush_evaluations(self) -> bool:
+        """Save all pending evaluations in one database round-trip
+
+        Returns False if the write failed and the evaluations were kept.
+        """
+        # One write at a time, so an older batch never commits after a newer
+        async with self._flush_lock:
+            if not self._pending_evaluations:
+                return True
+            pending, self._pending_evaluations = self._pending_evaluations, {}
+            try:
+                await self.db.aupdate_card_evaluations(pending)
+            except asyncio.CancelledError:
+                # The update is idempotent, so writing it again later is safe
+                self._requeue_evaluations(pending)
+                raise
+            except Exception as e:
+                LOG.error("Error saving evaluations: %s", e)
+                self._requeue_evaluations(pending)
+                return False
+            return True
+
+    async def aclose(self):
+        """Save the evaluations still pending and close the database"""
+        self._closing = True
+        task = self._flush_task
+        if task is not None and not task.done():
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        await self.aflush_evaluations()
+        await self.db.aclose()
 
     def get_current_card(self) -> Optional[Card]:
         """Get the current card or None if no cards"""
@@ -74,76 +195,171 @@ class AppState:
 app_state = AppState()
 
 
+_EMOJI: Dict[str, str] = {
+    "liked": "👍",
+    "disliked": "👎",
+    "seen": "👀",
+    "not_evaluated": "❓",
+}
+
+
+_STATUS_BY_EVAL: Dict[str, str] = {
+    evaluation: f"**Status:** {emoji} {evaluation.replace('_', ' ').title()}"
+    for evaluation, emoji in _EMOJI.items()
+}
+
+
 def get_evaluation_emoji(evaluation: str) -> str:
     """Get emoji representation of evaluation state"""
-    match evaluation:
-        case "liked":
-            return "👍"
-        case "disliked":
-            return "👎"
-        case "seen":
-            return "👀"
-        case "not_evaluated":
-            return "❓"
-        case _:
-            return "❓"
+    return _EMOJI.get(evaluation, "❓")
 
 
 def save_uploaded_file(file_obj) -> str:
-    """Save uploaded file to media folder with UUID-based filename"""
+    """Save uploaded file to media folder under the SHA-256 of its content
+
+    Identical documents map to the same path, so the path doubles as a
+    content-based key for the cards generated from it.
+    """
     media_folder = "media"
     os.makedirs(media_folder, exist_ok=True)
 
-    file_uuid = str(uuid.uuid4())
     # Get file extension from the original filename
-    file_extension = (
-        os.path.splitext(file_obj.name)[1] if hasattr(file_obj, "name") else ""
+    source_name = (
+        file_obj if isinstance(file_obj, str) else getattr(file_obj, "name", "")
     )
+    file_extension = os.path.splitext(source_name)[1]
+
+    # Copy in bounded chunks, hashing on the way, so memory stays O(chunk)
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=media_folder, delete=False) as dst:
+        # For Gradio, the file_obj is already a file path
+        src = open(file_obj, "rb") if isinstance(file_obj, str) else file_obj
+        try:
+            while chunk := src.read(UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                dst.write(chunk)
+        finally:
+            if src is not file_obj:
+                src.close()
+
+    file_path = os.path.join(media_folder, f"{digest.hexdigest()}{file_extension}")
+    if os.path.exists(file_path):
+        os.remove(dst.name)
+        LOG.info("File already saved as: %s", file_path)
+        return file_path
+
+    os.replace(dst.name, file_path)
+    LOG.info("File saved to: %s", file_path)
+    return file_path
 
-    unique_filename = f"{file_uuid}{file_extension}"
-    file_path = os.path.join(media_folder, unique_filename)
 
-    # For Gradio, the file_obj is already a file path
-    if isinstance(file_obj, str):
-        # Copy the file to our media folder
-        with open(file_obj, "rb") as src, open(file_path, "wb") as dst:
-            dst.write(src.read())
-    else:
-        # Handle file-like objects
-        with open(file_path, "wb") as f:
-            f.write(file_obj.read())
+async def ashutdown():
+    """Flush pending evaluations, close connections and stop PDF workers"""
+    await app_state.aclose()
+    if _HTTP is not None and not _HTTP.closed:
+        await _HTTP.close()
+    # Waits for the worker processes to exit, so keep it off the event loop
+    await asyncio.get_running_loop().run_in_executor(None, shutdown_pdf_pool)
 
-    LOG.info("File saved to: %s", file_path)
-    return file_path
 
+@contextlib.asynccontextmanager
+async def _lifespan(_app):
+    # Shutdown runs on the server's event loop, which owns the session and
+    # the database connections
+    yield
+    await ashutdown()
 
-async def fetch_url_content(url: str) -> str:
-    """Fetch content from URL"""
-    try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
 
-        content_type = response.headers.get("content-type", "").lower()
+def _http_session() -> aiohttp.ClientSession:
+    """Shared session, so fetches reuse pooled keep-alive connections"""
+    global _HTTP
+    if _HTTP is None or _HTTP.closed:
+        _HTTP = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=32, limit_per_host=16),
+            timeout=aiohttp.ClientTimeout(total=30),
+        )
+    return _HTTP
 
-        if "pdf" in content_type:
-            pdf_bytes = BytesIO(response.content)
-            reader = PdfReader(pdf_bytes)
-            return "\n".join(page.extract_text() for page in reader.pages)
-        elif "text" in content_type:
-            return response.text
-        else:
-            return response.text
+
+async def fetch_url_content(url: str) -> str:
+    """Fetch content from URL
+
+    PDFs are streamed to a temporary file instead of being buffered in
+    memory, and the text is read from that file.
+    """
+    try:
+        async with _http_session().get(url) as response:
+            response.raise_for_status()
+
+            content_type = response.headers.get("content-type", "").lower()
+
+            if "pdf" not in content_type:
+                return await response.text()
+
+            tmp = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+            try:
+                with tmp:
+                    async for chunk in response.content.iter_chunked(
+                        DOWNLOAD_CHUNK_SIZE
+                    ):
+                        tmp.write(chunk)
+            except BaseException:
+                # Interrupted or failed download, don't leave it behind
+                os.remove(tmp.name)
+                raise
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, read_pdf_text, tmp.name
+            )
+        finally:
+            os.remove(tmp.name)
     except Exception as e:
         raise ValueError(f"Failed to fetch URL content: {str(e)}")
 
 
+def read_pdf_text(file_path: str) -> str:
+    """Extract PDF text, reusing an earlier extraction of the same bytes"""
+    with open(file_path, "rb") as f:
+        digest = hashlib.file_digest(f, "sha256").hexdigest()
+    cache_path = os.path.join(TEXT_CACHE_FOLDER, f"{digest}.txt.z")
+    if os.path.exists(cache_path):
+        with open(cache_path, "rb") as f:
+            text = zlib.decompress(f.read()).decode("utf-8")
+        # The modification time doubles as the entry's last use
+        os.utime(cache_path)
+        return text
+
+    text = extract_pdf_text(file_path)
+    os.makedirs(TEXT_CACHE_FOLDER, exist_ok=True)
+    # Write then rename, so a crash never leaves a truncated entry behind
+    with tempfile.NamedTemporaryFile(dir=TEXT_CACHE_FOLDER, delete=False) as tmp:
+        tmp.write(zlib.compress(text.encode("utf-8")))
+    os.replace(tmp.name, cache_path)
+    _prune_text_cache()
+    return text
+
+
+def _prune_text_cache() -> None:
+    """Delete the least recently used entries beyond TEXT_CACHE_MAX_ENTRIES"""
+    entries = [
+        entry
+        for entry in os.scandir(TEXT_CACHE_FOLDER)
+        if entry.name.endswith(".txt.z")
+    ]
+    if len(entries) <= TEXT_CACHE_MAX_ENTRIES:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime_ns)
+    for entry in entries[: len(entries) - TEXT_CACHE_MAX_ENTRIES]:
+        # Another request may have removed it first
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(entry.path)
+
+
 def read_document(file_path: str) -> str:
     """Read document from file path"""
     try:
         if file_path.lower().endswith(".pdf"):
-            with open(file_path, "rb") as file:
-                reader = PdfReader(file)
-                return "\n".join(page.extract_text() for page in reader.pages)
+            return read_pdf_text(file_path)
         elif file_path.lower().endswith(".txt"):
             with open(file_path, "r", encoding="utf-8") as file:
                 return file.read()
@@ -158,58 +374,60 @@ async def process_document(
 ) -> Tuple[str, str]:
     """Process either a file or URL and return status message and card info"""
     try:
+        # Saved cards are about to be read back, so they must be up to date
+        await app_state.aflush_evaluations()
+
         if file_path:
             LOG.info("Processing uploaded file: %s", file_path)
             app_state.document_url = None
             app_state.local_file_path = save_uploaded_file(file_path)
             app_state.document_key = app_state.local_file_path
-            text = read_document(file_path)
-            app_state.document_context = text
-
         elif url:
             LOG.info("Processing URL: %s", url)
             app_state.local_file_path = None
             app_state.document_url = url
             app_state.document_key = url
-            text = await fetch_url_content(url)
-            app_state.document_context = text
         else:
             return "❌ Error: No file or URL provided", ""
 
-        LOG.info(
-            "Document context: %s", text[:200] + "..." if len(text) > 200 else text
-        )
-
-        # Check if cards already exist for this document
         existing_cards = await app_state.db.aload_cards(app_state.document_key)
 
         if existing_cards:
             LOG.info("Loading existing cards from database...")
-            app_state.cards = existing_cards
-            app_state.current_card_index = 0
-            app_state.total_cards = len(existing_cards)
+            app_state.set_cards(existing_cards)
             return (
                 "✅ Cards loaded from database successfully!",
                 f"📚 {len(existing_cards)} cards loaded",
             )
+
+        # Read only once the document is known to need cards: cancelling an
+        # executor future does not stop the extraction already running in it
+        if file_path:
+            text = await asyncio.get_running_loop().run_in_executor(
+                None, read_document, app_state.local_file_path
+            )
         else:
-            LOG.info("Generating new cards...")
-            cards_result = await app_state.card_generator.aforward(context=text)
+            text = await fetch_url_content(url)
+        app_state.document_context = text
 
-            app_state.cards = cards_result.cards
-            for card in app_state.cards:
-                card.context = app_state.document_key
-            app_state.current_card_index = 0
-            app_state.total_cards = len(app_state.cards)
+        LOG.info(
+            "Document context: %s", text[:200] + "..." if len(text) > 200 else text
+        )
 
-            # Save new cards to database and update the cards list with database IDs
-            cards = await app_state.db.asave_cards(app_state.cards)
-            app_state.cards = cards
+        LOG.info("Generating new cards...")
+        cards_result = await app_state.card_generator.aforward(context=text)
 
-            return (
-                "✅ Cards generated successfully!",
-                f"🎯 {len(app_state.cards)} new cards created",
-            )
+        for card in cards_result.cards:
+            card.context = app_state.document_key
+
+        # Save new cards to database and update the cards list with database IDs
+        cards = await app_state.db.asave_cards(cards_result.cards)
+        app_state.set_cards(cards)
+
+        return (
+            "✅ Cards generated successfully!",
+            f"🎯 {len(app_state.cards)} new cards created",
+        )
 
     except Exception as e:
         LOG.error("Error processing document: %s", e)
@@ -226,13 +444,12 @@ def get_card_display() -> CardDisplay:
         return CardDisplay.empty()
 
     current_evaluation = current_card.evaluation
-    evaluation_emoji = get_evaluation_emoji(current_evaluation)
+    status = _STATUS_BY_EVAL.get(current_evaluation)
+    if status is None:
+        status = f"**Status:** ❓ {current_evaluation.replace('_', ' ').title()}"
 
     # Card info
     card_info = f"Card {app_state.current_card_index + 1} of {len(app_state.cards)}"
-    status = (
-        f"**Status:** {evaluation_emoji} {current_evaluation.replace('_', ' ').title()}"
-    )
     topic = f"**Topic:** {current_card.topic}"
     question = f"**Question:** {current_card.question}"
     answer = f"**Answer:** {current_card.answer}"
@@ -240,6 +457,9 @@ def get_card_display() -> CardDisplay:
     # Button states
     prev_disabled = app_state.current_card_index == 0
     next_disabled = app_state.current_card_index >= len(app_state.cards) - 1
+    prev_update, next_update, reset_update = _NAV_STATES[
+        (not prev_disabled, not next_disabled)
+    ]
 
     return CardDisplay(
         card_info=card_info,
@@ -247,9 +467,9 @@ def get_card_display() -> CardDisplay:
         topic=topic,
         question=question,
         answer=answer,
-        prev_btn_update=gr.update(interactive=not prev_disabled),
-        next_btn_update=gr.update(interactive=not next_disabled),
-        reset_btn_update=gr.update(interactive=True),
+        prev_btn_update=prev_update,
+        next_btn_update=next_update,
+        reset_btn_update=reset_update,
     )
 
 
@@ -258,7 +478,7 @@ def get_summary_display() -> str:
     if not app_state.cards:
         return "No cards to summarize"
 
-    counts = Counter(card.evaluation for card in app_state.cards)
+    counts = app_state.evaluation_counts
     summary = f"""
     **Evaluation Summary:**
     - 👍 Liked: {counts['liked']}
@@ -272,23 +492,33 @@ def get_summary_display() -> str:
 async def _update_current_card_evaluation(evaluation: str):
     """Update the evaluation for a card"""
     current_card = app_state.cards[app_state.current_card_index]
-    current_card.evaluation = evaluation
-    await app_state.db.asave_cards([current_card])
+    app_state.set_card_evaluation(current_card, evaluation)
+    app_state.queue_evaluation_write(current_card)
 
 
 async def mark_card_as_seen_if_needed():
-    """Mark current card as seen if not evaluated"""
-    current_card = app_state.cards[app_state.current_card_index]
-    if current_card.evaluation == "not_evaluated":
+    """Mark current card as seen if not evaluated and shown long enough to read"""
+    current_card = app_state.get_current_card()
+    if (
+        current_card is not None
+        and current_card.evaluation == "not_evaluated"
+        and time.monotonic() - app_state.card_shown_at >= SEEN_MIN_DWELL
+    ):
         await _update_current_card_evaluation("seen")
 
 
+async def _move_to_card(index: int):
+    """Leave the current card for another one, marking the one left as seen"""
+    if index != app_state.current_card_index:
+        await mark_card_as_seen_if_needed()
+        app_state.show_card(index)
+    return (*get_card_display(), get_summary_display())
+
+
 async def _auto_advance_to_next_card():
     """Auto-advance to next card"""
     if app_state.current_card_index < len(app_state.cards) - 1:
-        app_state.current_card_index += 1
-        await mark_card_as_seen_if_needed()
-
+        return await _move_to_card(app_state.current_card_index + 1)
     return (*get_card_display(), get_summary_display())
 
 
@@ -306,10 +536,7 @@ async def handle_dislike_card():
 
 async def handle_previous_card():
     """Handle previous button click"""
-    if app_state.current_card_index > 0:
-        app_state.current_card_index -= 1
-    await mark_card_as_seen_if_needed()
-    return (*get_card_display(), get_summary_display())
+    return await _move_to_card(max(app_state.current_card_index - 1, 0))
 
 
 async def handle_next_card():
@@ -319,9 +546,7 @@ async def handle_next_card():
 
 async def handle_reset_cards():
     """Handle reset button click"""
-    app_state.current_card_index = 0
-    await mark_card_as_seen_if_needed()
-    return (*get_card_display(), get_summary_display())
+    return await _move_to_card(0)
 
 
 async def get_database_stats() -> str:
@@ -428,7 +653,14 @@ def create_interface():
         def setup_card_action_button(button, handler_func):
             button.click(handler_func, outputs=card_display_outputs)
 
+        async def warmup_handler():
+            # Create tables and open a pooled connection, pragmas included,
+            # before the first document is submitted
+            await app_state.db.ainit_database()
+            return await get_database_stats()
+
         # Wire up events
+        app.load(warmup_handler, outputs=[db_stats])
         process_btn.click(
             process_document_handler,
             inputs=[file_input, url_input],
@@ -449,7 +681,12 @@ def main():
     logging.getLogger("httpx").setLevel(logging.WARNING)
 
     app = create_interface()
-    app.launch(server_name="0.0.0.0", server_port=7860, share=False)
+    app.launch(
+        server_name="0.0.0.0",
+        server_port=7860,
+        share=False,
+        app_kwargs={"lifespan": _lifespan},
+    )
 
 
 if __name__ == "__main__":
@@ -1,9 +1,22 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
 import dspy
 from gpt_to_anki.data_objects import Card
+from gpt_to_anki.database import CardDatabase
+
+if TYPE_CHECKING:
+    import numpy as np
 
 lm = dspy.LM(model="gpt-4o-mini", temperature=0.7)
 dspy.configure(lm=lm)
 
+GENERATION_TEMPERATURE = 0.3
+# Uncached contexts sent together in one batched LM call
+BATCH_SIZE = 4
+
 
 class GenerateCards(dspy.Signature):
     """Given context, generate at most 10 question-answer pairs suitable for flashcards about the topic."""  # noqa
@@ -18,27 +31,252 @@ class GenerateCards(dspy.Signature):
     )
 
 
+class GenerateCardsBatch(dspy.Signature):
+    """Given several independent contexts, each starting with its [index], generate at most 10 question-answer pairs suitable for flashcards about the topic of each one, keeping the outputs in index order."""  # noqa
+
+    contexts: str = dspy.InputField(desc="Contexts as [0] ..., [1] ..., and so on")
+    topics: list[str] = dspy.OutputField(desc="One topic per context")
+    questions: list[list[str]] = dspy.OutputField(
+        desc="Per context, a list of exactly 10 questions for flashcards"
+    )
+    answers: list[list[str]] = dspy.OutputField(
+        desc="Per context, a list of exactly 10 answers corresponding to the questions"
+    )
+
+
+class SemanticCache:
+    """Predictions of earlier contexts, found again by embedding similarity.
+
+    Catches near-duplicate documents (re-exports, whitespace changes) that the
+    exact-match cache misses, at the price of one embedding call per lookup.
+    """
+
+    def __init__(
+        self,
+        embedder: dspy.Embedder,
+        threshold: float = 0.95,
+        max_entries: int = 256,
+        max_chars: int = 8000,
+    ):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        # Unit-length embeddings and their predictions, oldest first
+        self._vectors: List["np.ndarray"] = []
+        self._predictions: List[dspy.Prediction] = []
+
+    async def aembed(self, context: str) -> "np.ndarray":
+        # numpy is only needed once the opt-in cache is used
+        import numpy as np
+
+        vector = await self.embedder.acall(context[: self.max_chars])
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, vector: "np.ndarray") -> Optional[dspy.Prediction]:
+        """Return the prediction of the most similar context above threshold"""
+        if not self._vectors:
+            return None
+        import numpy as np
+
+        # Dot products of unit vectors are cosine similarities
+        scores = np.stack(self._vectors) @ vector
+        best = int(scores.argmax())
+        if scores[best] < self.threshold:
+            return None
+        return self._predictions[best]
+
+    def add(self, vector: "np.ndarray", prediction: dspy.Prediction) -> None:
+        self._vectors.append(vector)
+        self._predictions.append(prediction)
+        if len(self._vectors) > self.max_entries:
+            del self._vectors[0], self._predictions[0]
+
+
 class CardGenerator(dspy.Module):
-    def __init__(self):
+    def __init__(
+        self,
+        cache_size: int = 64,
+        semantic_cache: Optional[SemanticCache] = None,
+        db: Optional[CardDatabase] = None,
+    ):
         super().__init__()
         self.generate_cards = dspy.Predict(GenerateCards)
+        self.generate_cards_batch = dspy.Predict(GenerateCardsBatch)
+        self.cache_size = cache_size
+        # sha256(context) -> prediction, least recently used first
+        self._cache: OrderedDict[str, dspy.Prediction] = OrderedDict()
+        # Opt-in, as it costs an embedding call for every new context
+        self.semantic_cache = semantic_cache
+        # Persistent exact-match cache, survives restarts
+        self.db = db
+
+    @staticmethod
+    def _response_key(model: str, context: str) -> str:
+        key = f"{model}|{GENERATION_TEMPERATURE}|{context}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _context_key(context: str) -> str:
+        return hashlib.sha256(context.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, result: dspy.Prediction) -> None:
+        self._cache[key] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _alookup(
+        self, context: str
+    ) -> Tuple[Optional[dspy.Prediction], Optional["np.ndarray"]]:
+        """Find a context's prediction in the caches, cheapest first
+
+        Also returns the context's embedding when the semantic cache computed
+        one, so a miss can be stored without embedding it again.
+        """
+        key = self._context_key(context)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key], None
+
+        if self.db is not None:
+            response = await self.db.aload_llm_response(self._db_key(context))
+            if response is not None:
+                return dspy.Prediction(**response), None
+
+        if self.semantic_cache is not None:
+            vector = await self.semantic_cache.aembed(context)
+            return self.semantic_cache.lookup(vector), vector
+
+        return None, None
+
+    def _db_key(self, context: str) -> str:
+        return self._response_key(self._model(), context)
+
+    @staticmethod
+    def _model() -> str:
+        return dspy.settings.lm.model if dspy.settings.lm else ""
+
+    async def _astore(
+        self,
+        context: str,
+        result: dspy.Prediction,
+        vector: Optional["np.ndarray"],
+    ) -> None:
+        """Save a freshly generated prediction to the caches behind memory"""
+        if vector is not None:
+            self.semantic_cache.add(vector, result)
+        if self.db is not None:
+            await self.db.asave_llm_response(
+                self._db_key(context), self._model(), result.toDict()
+            )
+
+    async def _apredict(self, context: str) -> dspy.Prediction:
+        """Run the predictor once per distinct context"""
+        result, vector = await self._alookup(context)
+        if result is None:
+            result = await self.generate_cards.acall(
+                context=context, temperature=GENERATION_TEMPERATURE
+            )
+            await self._astore(context, result, vector)
+
+        self._remember(self._context_key(context), result)
+        return result
+
+    async def _agenerate_batch(self, contexts: List[str]) -> List[dspy.Prediction]:
+        """Ask the LM about up to BATCH_SIZE contexts in one call"""
+        if len(contexts) == 1:
+            return [
+                await self.generate_cards.acall(
+                    context=contexts[0], temperature=GENERATION_TEMPERATURE
+                )
+            ]
+
+        result = await self.generate_cards_batch.acall(
+            contexts="\n\n".join(
+                f"[{index}] {context}" for index, context in enumerate(contexts)
+            ),
+            temperature=GENERATION_TEMPERATURE,
+        )
+        topics, questions, answers = (
+            getattr(result, name, None) or []
+            for name in ("topics", "questions", "answers")
+        )
+        if not len(topics) == len(questions) == len(answers) == len(contexts):
+            # The model lost track of the contexts, ask for each on its own
+            return list(
+                await asyncio.gather(
+                    *(
+                        self.generate_cards.acall(
+                            context=context, temperature=GENERATION_TEMPERATURE
+                        )
+                        for context in contexts
+                    )
+                )
+            )
+
+        return [
+            dspy.Prediction(topic=topic, questions=qs, answers=ans)
+            for topic, qs, ans in zip(topics, questions, answers)
+        ]
+
+    async def abatch_forward(self, contexts: List[str]) -> List[dspy.Prediction]:
+        """Generate cards for several contexts, batching the uncached ones
+
+        Every context goes through the same caches as aforward; only the
+        misses are sent to the LM, BATCH_SIZE per call.
+        """
+        distinct = list(dict.fromkeys(contexts))
+        found = await asyncio.gather(*map(self._alookup, distinct))
+
+        predictions = {}
+        misses = []
+        for context, (result, vector) in zip(distinct, found):
+            if result is None:
+                misses.append((context, vector))
+            else:
+                predictions[context] = result
+
+        batches = [
+            misses[start : start + BATCH_SIZE]
+            for start in range(0, len(misses), BATCH_SIZE)
+        ]
+        generated = await asyncio.gather(
+            *(
+                self._agenerate_batch([context for context, _ in batch])
+                for batch in batches
+            )
+        )
+        for batch, results in zip(batches, generated):
+            for (context, vector), result in zip(batch, results):
+                await self._astore(context, result, vector)
+                predictions[context] = result
+
+        for context in distinct:
+            self._remember(self._context_key(context), predictions[context])
+        return [self._with_cards(predictions[context], context) for context in contexts]
 
     async def aforward(self, context: str) -> dspy.Prediction:
-        result = await self.generate_cards.acall(context=context, temperature=0.3)
+        prediction = await self._apredict(context)
+        return self._with_cards(prediction, context)
+
+    @staticmethod
+    def _with_cards(prediction: dspy.Prediction, context: str) -> dspy.Prediction:
+        # Cards are mutated by callers, so every call gets fresh ones
+        result = dspy.Prediction(**prediction.toDict())
 
         # Convert questions and answers lists to Card objects
         questions = result.questions if hasattr(result, "questions") else []
         answers = result.answers if hasattr(result, "answers") else []
-        min_length = min(len(questions), len(answers))
+        topic = result.topic
 
+        # DSPy already parsed the outputs as list[str], skip validation
         cards = [
-            Card(
-                question=questions[i],
-                answer=answers[i],
-                topic=result.topic,
-                context=context,
+            Card.model_construct(
+                question=question, answer=answer, topic=topic, context=context
             )
-            for i in range(min_length)
+            for question, answer in zip(questions, answers)
         ]
 
         result.cards = cards
@@ -1,9 +1,19 @@
+import asyncio
 import logging
-from typing import List
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, func
+import operator
+import time
+import zlib
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import orjson
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, LargeBinary, func
+from sqlalchemy import BigInteger, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import select, delete
+from sqlalchemy.orm import declarative_base
+from sqlalchemy import select, delete, insert, update, bindparam, event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from gpt_to_anki.data_objects import Card
 from gpt_to_anki.anki_models import AnkiNoteFeedback
@@ -12,6 +22,45 @@ LOG = logging.getLogger(__name__)
 
 Base = declarative_base()
 
+# Current Unix time in milliseconds, computed by SQLite
+_NOW_MILLIS = text("(CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER))")
+
+# Schema version kept in SQLite's user_version; migrations up to it run once
+SCHEMA_VERSION = 1
+
+# Version 1: databases made while updated_at was a DateTime hold it as
+# datetime text. Convert those values to Unix milliseconds, falling back to
+# now for any value SQLite cannot parse.
+_MIGRATE_UPDATED_AT = text(
+    "UPDATE anki_feedback SET updated_at = COALESCE("
+    "CAST(ROUND((julianday(updated_at) - 2440587.5) * 86400000) AS INTEGER), "
+    f"{_NOW_MILLIS.text}) "
+    "WHERE typeof(updated_at) != 'integer'"
+)
+
+# Applied to every new SQLite connection: WAL lets readers run alongside the
+# writer and, with synchronous=NORMAL, commits append to the log instead of
+# waiting for an fsync each
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+_PRAGMA_SCRIPT = ";\n".join(SQLITE_PRAGMAS) + ";"
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    # All pragmas in one executescript, a single trip to aiosqlite's thread
+    # instead of a cursor round trip per pragma
+    dbapi_connection.await_(
+        dbapi_connection.driver_connection.executescript(_PRAGMA_SCRIPT)
+    )
+
 
 class CardRecord(Base):
     __tablename__ = "cards"
@@ -20,7 +69,8 @@ class CardRecord(Base):
     question = Column(String, nullable=False)
     answer = Column(String, nullable=False)
     evaluation = Column(String, default="not_evaluated")
-    context = Column(String, nullable=False)
+    # Document key (upload path or URL), not the document text
+    context = Column(String, nullable=False, index=True)
     topic = Column(String, nullable=False)
 
 
@@ -37,76 +87,166 @@ class AnkiFeedbackRecord(Base):
     topic = Column(String, default="")
     suspended = Column(Boolean, default=False, nullable=False)
     flag = Column(Integer, default=0, nullable=False)
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # Unix time in milliseconds
+    updated_at = Column(
+        BigInteger, server_default=_NOW_MILLIS, onupdate=_NOW_MILLIS, nullable=False
+    )
+
+
+# Feedback columns named after the AnkiNoteFeedback fields they load into
+_FEEDBACK_FIELDS = tuple(AnkiNoteFeedback.model_fields)
+_FEEDBACK_COLUMNS = [getattr(AnkiFeedbackRecord, name) for name in _FEEDBACK_FIELDS]
+# Reads all those fields off a model in one C-level call
+_feedback_values = operator.attrgetter(*_FEEDBACK_FIELDS)
+
+# Built once, and with the ids bound as one JSON array the SQL text is the
+# same for any number of ids and never hits SQLite's bound-variable limit
+_FEEDBACK_IDS = func.json_each(bindparam("ids", type_=String)).table_valued("value")
+_LOAD_FEEDBACK_STMT = select(*_FEEDBACK_COLUMNS).where(
+    AnkiFeedbackRecord.database_id.in_(select(_FEEDBACK_IDS.c.value))
+)
+
+
+class LLMCacheRecord(Base):
+    __tablename__ = "llm_cache"
+
+    key = Column(String, primary_key=True)
+    model = Column(String, nullable=False)
+    # zlib-compressed JSON of the prediction fields
+    response = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
 class CardDatabase:
-    def __init__(self, db_path: str = "cards.db"):
+    def __init__(self, db_path: str = "cards.db", cache_contexts: bool = True):
         self.db_path = db_path
         self.engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        event.listen(self.engine.sync_engine, "connect", _set_sqlite_pragmas)
         self.async_session = async_sessionmaker(
             self.engine, class_=AsyncSession, expire_on_commit=False
         )
         self._initialized = False
+        self._init_lock = asyncio.Lock()
+        # Session of the innermost session_scope in the current task, if any
+        self._scoped_session: ContextVar[Optional[AsyncSession]] = ContextVar(
+            f"card_database_session_{id(self)}", default=None
+        )
+        # aget_contexts result, dropped by every write that can change it. Turn
+        # off when other processes write to the same database file.
+        self._cache_contexts = cache_contexts
+        self._contexts_cache: Optional[List[str]] = None
+        # Bumped after each such write commits, so a read that overlapped the
+        # write does not cache the rows it saw before the commit
+        self._contexts_generation = 0
+
+    @asynccontextmanager
+    async def session_scope(self) -> AsyncIterator[AsyncSession]:
+        """Run the calls made inside on one session and commit them once."""
+        session = self._scoped_session.get()
+        if session is not None:
+            # Nested scopes join the outer transaction
+            yield session
+            return
+
+        async with self.async_session() as session:
+            token = self._scoped_session.set(session)
+            try:
+                yield session
+                await session.commit()
+            except BaseException:
+                await session.rollback()
+                raise
+            finally:
+                self._scoped_session.reset(token)
+                self._invalidate_contexts()
+
+    @asynccontextmanager
+    async def _session(self) -> AsyncIterator[AsyncSession]:
+        """The session_scope session if one is active, a new session otherwise."""
+        session = self._scoped_session.get()
+        if session is not None:
+            yield session
+            return
+        async with self.async_session() as session:
+            yield session
+
+    def _invalidate_contexts(self) -> None:
+        self._contexts_cache = None
+        self._contexts_generation += 1
+
+    async def _acommit(self, session: AsyncSession) -> None:
+        # Inside session_scope the scope commits once, when it ends
+        if session is not self._scoped_session.get():
+            await session.commit()
 
     async def ainit_database(self):
         """Initialize the database and create the cards table if it doesn't exist."""
         if self._initialized:
             return
 
-        try:
-            async with self.engine.begin() as conn:
-                await conn.run_sync(Base.metadata.create_all)
-            self._initialized = True
-            LOG.info("Database initialized successfully")
-        except Exception as e:
-            LOG.error("Error initializing database: %s", e)
-            raise
+        # Concurrent first calls wait for a single initialization
+        async with self._init_lock:
+            if self._initialized:
+                return
+            try:
+                async with self.engine.begin() as conn:
+                    await conn.run_sync(Base.metadata.create_all)
+                    # create_all only indexes tables it creates, so add indexes
+                    # introduced since an existing database was made
+                    await conn.run_sync(self._create_missing_indexes)
+                    await self._amigrate(conn)
+                self._initialized = True
+                LOG.info("Database initialized successfully")
+            except Exception as e:
+                LOG.error("Error initializing database: %s", e)
+                raise
+
+    @staticmethod
+    async def _amigrate(conn) -> None:
+        """Bring an existing database up to SCHEMA_VERSION, once."""
+        version = (await conn.execute(text("PRAGMA user_version"))).scalar_one()
+        if version >= SCHEMA_VERSION:
+            return
+        if version < 1:
+            await conn.execute(_MIGRATE_UPDATED_AT)
+        await conn.execute(text(f"PRAGMA user_version = {SCHEMA_VERSION}"))
+
+    @staticmethod
+    def _create_missing_indexes(conn) -> None:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
 
     async def asave_cards(self, cards: List[Card]) -> List[Card]:
         """Save cards to the database and return updated cards with database IDs."""
+        if not cards:
+            return []
+
         try:
-            async with self.async_session() as session:
-                # Get all database IDs for existing cards
-                existing_ids = [
-                    card.database_id for card in cards if card.database_id is not None
+            async with self._session() as session:
+                # One upsert keyed on the primary key for all cards: SQLite
+                # decides between insert and update, new cards have no id and
+                # get one assigned, and RETURNING hands all ids back in order
+                rows = [
+                    {"id": card.database_id, **card.model_dump(exclude={"database_id"})}
+                    for card in cards
                 ]
-
-                # Fetch all existing cards in one query
-                existing_cards_map = {}
-                if existing_ids:
-                    stmt = select(CardRecord).where(CardRecord.id.in_(existing_ids))
-                    result = await session.execute(stmt)
-                    existing_cards = result.scalars().all()
-                    existing_cards_map = {card.id: card for card in existing_cards}
-
-                card_records = []
-                for card in cards:
-                    if card.database_id in existing_cards_map:
-                        # Update existing card
-                        existing_card = existing_cards_map[card.database_id]
-                        card_data = card.model_dump(
-                            exclude_defaults=True, exclude={"database_id"}
-                        )
-                        for key, value in card_data.items():
-                            setattr(existing_card, key, value)
-                        card_records.append(existing_card)
-                    else:
-                        # Create new card
-                        new_card_obj = CardRecord(
-                            **card.model_dump(
-                                exclude_defaults=True, exclude={"database_id"}
-                            )
-                        )
-                        session.add(new_card_obj)
-                        card_records.append(new_card_obj)
-
-                await session.commit()
+                stmt = sqlite_insert(CardRecord)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[CardRecord.id],
+                    set_={
+                        name: stmt.excluded[name] for name in rows[0] if name != "id"
+                    },
+                ).returning(CardRecord.id, sort_by_parameter_order=True)
+                result = await session.execute(stmt, rows)
+                saved_ids = result.scalars().all()
+
+                await self._acommit(session)
 
             updated_cards = []
-            for i, card_record in enumerate(card_records):
-                updated_card = cards[i].model_copy()
-                updated_card.database_id = card_record.id
+            for card, card_id in zip(cards, saved_ids):
+                updated_card = card.model_copy()
+                updated_card.database_id = card_id
                 updated_cards.append(updated_card)
 
             LOG.info("Saved %d cards", len(cards))
@@ -114,22 +254,79 @@ class CardDatabase:
         except Exception as e:
             LOG.error("Error saving cards: %s", e)
             raise
+        finally:
+            self._invalidate_contexts()
+
+    async def asave_many_contexts(
+        self, cards_by_context: Dict[str, List[Card]]
+    ) -> Dict[str, List[Card]]:
+        """Save the cards of several contexts together, keyed like the input."""
+        # SQLite has a single writer, so parallel saves would only queue on
+        # its lock: one upsert over all contexts is one transaction instead
+        cards = [
+            card.model_copy(update={"context": context})
+            for context, context_cards in cards_by_context.items()
+            for card in context_cards
+        ]
+        saved = iter(await self.asave_cards(cards))
+        return {
+            context: [next(saved) for _ in context_cards]
+            for context, context_cards in cards_by_context.items()
+        }
+
+    async def aupdate_card_evaluations(self, evaluations: Dict[int, str]) -> None:
+        """Set the evaluation of many cards, by database id, in one statement."""
+        if not evaluations:
+            return
+
+        try:
+            async with self._session() as session:
+                # Core executemany UPDATE matching rows on the primary key
+                stmt = (
+                    update(CardRecord.__table__)
+                    .where(CardRecord.id == bindparam("b_id"))
+                    .values(evaluation=bindparam("b_evaluation"))
+                )
+                params = [
+                    {"b_id": card_id, "b_evaluation": evaluation}
+                    for card_id, evaluation in evaluations.items()
+                ]
+                await session.execute(stmt, params)
+                await self._acommit(session)
+        except Exception as e:
+            LOG.error("Error updating card evaluations: %s", e)
+            raise
 
     async def aload_cards(self, context: str) -> List[Card]:
         """Load cards and evaluations for a specific context."""
         try:
-            async with self.async_session() as session:
+            async with self._session() as session:
                 stmt = (
-                    select(CardRecord)
+                    select(
+                        CardRecord.id,
+                        CardRecord.question,
+                        CardRecord.answer,
+                        CardRecord.topic,
+                        CardRecord.evaluation,
+                    )
                     .where(CardRecord.context == context)
                     .order_by(CardRecord.id)
                 )
                 result = await session.execute(stmt)
-                card_records = result.scalars().all()
 
-                cards = [Card.model_validate(card_orm) for card_orm in card_records]
-                for card in cards:
-                    card.context = context
+                # Plain rows into model_construct: the schema already
+                # guarantees the types, so skip ORM and Pydantic validation
+                cards = [
+                    Card.model_construct(
+                        question=row.question,
+                        answer=row.answer,
+                        topic=row.topic,
+                        context=context,
+                        evaluation=row.evaluation,
+                        database_id=row.id,
+                    )
+                    for row in result.all()
+                ]
 
                 LOG.info("Loaded %d cards for context: %s", len(cards), context)
                 return cards
@@ -137,15 +334,40 @@ class CardDatabase:
             LOG.error("Error loading cards: %s", e)
             return []
 
+    async def aload_database_ids(self, context: str) -> List[int]:
+        """Load only the database ids of the cards for a specific context."""
+        try:
+            async with self._session() as session:
+                stmt = (
+                    select(CardRecord.id)
+                    .where(CardRecord.context == context)
+                    .order_by(CardRecord.id)
+                )
+                result = await session.execute(stmt)
+                return list(result.scalars().all())
+        except Exception as e:
+            LOG.error("Error loading card ids: %s", e)
+            return []
+
     async def aget_contexts(self) -> List[str]:
         """Get all unique contexts (file paths) that have cards."""
+        if self._contexts_cache is not None:
+            return list(self._contexts_cache)
+        generation = self._contexts_generation
         try:
-            async with self.async_session() as session:
+            async with self._session() as session:
                 stmt = (
                     select(CardRecord.context).distinct().order_by(CardRecord.context)
                 )
                 result = await session.execute(stmt)
-                contexts = result.scalars().all()
+                contexts = list(result.scalars().all())
+                # Uncommitted writes of an open session_scope may still roll back
+                if (
+                    self._cache_contexts
+                    and self._scoped_session.get() is None
+                    and generation == self._contexts_generation
+                ):
+                    self._contexts_cache = contexts
                 return list(contexts)
         except Exception as e:
             LOG.error("Error getting contexts: %s", e)
@@ -154,70 +376,80 @@ class CardDatabase:
     async def adelete_context(self, context: str):
         """Delete all cards for a specific context."""
         try:
-            async with self.async_session() as session:
-                delete_stmt = delete(CardRecord).where(CardRecord.context == context)
+            async with self._session() as session:
+                # No loaded CardRecords to sync: skip the identity-map pass
+                delete_stmt = (
+                    delete(CardRecord)
+                    .where(CardRecord.context == context)
+                    .execution_options(synchronize_session=False)
+                )
                 result = await session.execute(delete_stmt)
-                await session.commit()
+                await self._acommit(session)
                 LOG.info("Deleted %d cards for context: %s", result.rowcount, context)
         except Exception as e:
             LOG.error("Error deleting context: %s", e)
+        finally:
+            self._invalidate_contexts()
 
     async def aclear_all_cards(self):
         """Delete all cards from the database."""
-        await self.ainit_database()
+        if not self._initialized:
+            await self.ainit_database()
 
         try:
-            async with self.async_session() as session:
-                delete_stmt = delete(CardRecord)
+            async with self._session() as session:
+                # Unfiltered so SQLite can apply its truncate optimization
+                delete_stmt = delete(CardRecord).execution_options(
+                    synchronize_session=False
+                )
                 result = await session.execute(delete_stmt)
-                await session.commit()
+                await self._acommit(session)
                 LOG.info("Deleted all %d cards from database", result.rowcount)
         except Exception as e:
             LOG.error("Error clearing all cards: %s", e)
+        finally:
+            self._invalidate_contexts()
 
-    async def asave_anki_feedback(self, feedback_list: List[AnkiNoteFeedback]) -> None:
-        """Upsert Anki feedback for given cards using database_id as a unique key."""
-        if not feedback_list:
-            return
+    async def asave_anki_feedback(
+        self, feedback_list: List[AnkiNoteFeedback]
+    ) -> Dict[int, int]:
+        """Upsert Anki feedback for given cards using database_id as a unique key.
 
-        await self.ainit_database()
-        database_ids = [f.database_id for f in feedback_list]
+        Returns the stored updated_at (Unix milliseconds) by database id.
+        """
+        if not feedback_list:
+            return {}
+
+        if not self._initialized:
+            await self.ainit_database()
+        # One timestamp for the whole batch, bound like any other column
+        updated_at = time.time_ns() // 1_000_000
+        # Last feedback wins if the same card is listed twice
+        rows = {
+            fb.database_id: dict(
+                zip(_FEEDBACK_FIELDS, _feedback_values(fb)), updated_at=updated_at
+            )
+            for fb in feedback_list
+        }
 
         try:
-            async with self.async_session() as session:
-                # Load existing rows
-                stmt = select(AnkiFeedbackRecord).where(
-                    AnkiFeedbackRecord.database_id.in_(database_ids)
+            async with self._session() as session:
+                # One executemany upsert keyed on database_id, no pre-SELECT
+                stmt = sqlite_insert(AnkiFeedbackRecord)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[AnkiFeedbackRecord.database_id],
+                    set_={
+                        name: stmt.excluded[name]
+                        for name in next(iter(rows.values()))
+                        if name != "database_id"
+                    },
+                ).returning(
+                    AnkiFeedbackRecord.database_id, AnkiFeedbackRecord.updated_at
                 )
-                result = await session.execute(stmt)
-                existing = {row.database_id: row for row in result.scalars().all()}
-
-                for fb in feedback_list:
-                    row = existing.get(fb.database_id)
-                    if row is None:
-                        row = AnkiFeedbackRecord(
-                            database_id=fb.database_id,
-                            anki_note_id=fb.anki_note_id,
-                            deck_name=fb.deck_name,
-                            model_name=fb.model_name,
-                            question=fb.question,
-                            answer=fb.answer,
-                            topic=fb.topic,
-                            suspended=fb.suspended,
-                            flag=fb.flag,
-                        )
-                        session.add(row)
-                    else:
-                        row.anki_note_id = fb.anki_note_id
-                        row.deck_name = fb.deck_name
-                        row.model_name = fb.model_name
-                        row.question = fb.question
-                        row.answer = fb.answer
-                        row.topic = fb.topic
-                        row.suspended = fb.suspended
-                        row.flag = fb.flag
-
-                await session.commit()
+                result = await session.execute(stmt, list(rows.values()))
+                stamps = dict(result.tuples().all())
+                await self._acommit(session)
+                return stamps
         except Exception as e:
             LOG.error("Error saving Anki feedback: %s", e)
             raise
@@ -227,19 +459,65 @@ class CardDatabase:
         if not database_ids:
             return []
 
-        await self.ainit_database()
+        if not self._initialized:
+            await self.ainit_database()
+        ids = orjson.dumps(list(database_ids)).decode()
         try:
-            async with self.async_session() as session:
-                stmt = select(AnkiFeedbackRecord).where(
-                    AnkiFeedbackRecord.database_id.in_(database_ids)
-                )
-                result = await session.execute(stmt)
-                rows = result.scalars().all()
-                return [AnkiNoteFeedback.model_validate(r) for r in rows]
+            async with self._session() as session:
+                result = await session.execute(_LOAD_FEEDBACK_STMT, {"ids": ids})
+                return [
+                    AnkiNoteFeedback.model_construct(**row._mapping)
+                    for row in result.all()
+                ]
         except Exception as e:
             LOG.error("Error loading Anki feedback: %s", e)
             return []
 
+    async def aload_anki_feedback_map(
+        self, database_ids: List[int]
+    ) -> Dict[int, AnkiNoteFeedback]:
+        """Load Anki feedback for the given database ids, keyed by database id."""
+        feedback = await self.aload_anki_feedback(database_ids)
+        return {fb.database_id: fb for fb in feedback}
+
+    async def aload_llm_response(self, key: str) -> Optional[Dict[str, Any]]:
+        """Load a cached LLM response by its key, None if not cached."""
+        if not self._initialized:
+            await self.ainit_database()
+        try:
+            async with self._session() as session:
+                stmt = select(LLMCacheRecord.response).where(LLMCacheRecord.key == key)
+                result = await session.execute(stmt)
+                response = result.scalar_one_or_none()
+                if response is None:
+                    return None
+                return orjson.loads(zlib.decompress(response))
+        except Exception as e:
+            LOG.error("Error loading LLM response: %s", e)
+            return None
+
+    async def asave_llm_response(
+        self, key: str, model: str, response: Dict[str, Any]
+    ) -> None:
+        """Cache an LLM response under its key, keeping an existing entry."""
+        if not self._initialized:
+            await self.ainit_database()
+        try:
+            async with self._session() as session:
+                stmt = (
+                    sqlite_insert(LLMCacheRecord)
+                    .values(
+                        key=key,
+                        model=model,
+                        response=zlib.compress(orjson.dumps(response)),
+                    )
+                    .on_conflict_do_nothing(index_elements=[LLMCacheRecord.key])
+                )
+                await session.execute(stmt)
+                await self._acommit(session)
+        except Exception as e:
+            LOG.error("Error saving LLM response: %s", e)
+
     async def aclose(self):
         """Close the database connection."""
         await self.engine.dispose()
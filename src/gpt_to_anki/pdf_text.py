@@ -0,0 +1,81 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from itertools import repeat
+from typing import List, Optional, Union
+
+from pypdf import PdfReader
+
+PDF_MAX_WORKERS = 8
+PDF_PAGES_PER_TASK = 10
+
+# One pool for the life of the process, started on first use. Spawned rather
+# than forked: extraction is called from worker threads of a threaded server,
+# and forking a multi-threaded process can leave locks held in the child.
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(
+                max_workers=min(PDF_MAX_WORKERS, os.cpu_count() or 1),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _POOL
+
+
+def shutdown_pdf_pool() -> None:
+    """Stop the worker processes; the next extraction starts a new pool"""
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+def _open_pdf(source: Union[str, bytes]) -> PdfReader:
+    """Open a PDF from a file path or from its bytes"""
+    return PdfReader(BytesIO(source) if isinstance(source, bytes) else source)
+
+
+def _extract_pdf_pages(path: str, start: int, stop: int) -> List[str]:
+    """Extract text of pages [start, stop) using a reader of its own"""
+    # reader.pages builds a new page list wrapper on every access
+    pages = _open_pdf(path).pages
+    return [pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _extract_in_pool(path: str, page_count: int) -> str:
+    # Extraction is CPU-bound pure Python, so threads would serialize on the
+    # GIL; each worker process opens its own reader from the path
+    starts = range(0, page_count, PDF_PAGES_PER_TASK)
+    stops = [min(start + PDF_PAGES_PER_TASK, page_count) for start in starts]
+    # map yields blocks in page order
+    blocks = _get_pool().map(_extract_pdf_pages, repeat(path), starts, stops)
+    return "\n".join(text for block in blocks for text in block)
+
+
+def extract_pdf_text(source: Union[str, bytes]) -> str:
+    """Extract text from all PDF pages, spreading blocks of pages over processes"""
+    reader = _open_pdf(source)
+    pages = reader.pages
+    page_count = len(pages)
+    if page_count <= PDF_PAGES_PER_TASK:
+        return "\n".join(pages[i].extract_text() or "" for i in range(page_count))
+
+    if isinstance(source, str):
+        return _extract_in_pool(source, page_count)
+
+    # Workers get a path, not a copy of the whole document per task
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        tmp.write(source)
+    try:
+        return _extract_in_pool(tmp.name, page_count)
+    finally:
+        os.unlink(tmp.name)
@@ -1,7 +1,7 @@
 """Pytest configuration for gpt-to-anki tests."""
 import pytest
-import asyncio
 import sys
+import uuid
 from pathlib import Path
 
 # Add src to Python path
@@ -10,8 +10,14 @@ sys.path.insert(0, str(src_path))
 
 
 @pytest.fixture(scope="session")
-def event_loop():
-    """Create an instance of the default event loop for the test session."""
-    loop = asyncio.get_event_loop_policy().new_event_loop()
-    yield loop
-    loop.close()
\ No newline at end of file
+def memory_db_path():
+    """Make unique in-memory SQLite database paths for CardDatabase.
+
+    A shared-cache memory database lives as long as a connection to it is
+    open, i.e. until the CardDatabase's engine is disposed.
+    """
+
+    def make(name: str) -> str:
+        return f"file:{name}_{uuid.uuid4().hex}?mode=memory&cache=shared&uri=true"
+
+    return make
@@ -1,8 +1,7 @@
 """Integration tests for Anki feedback synchronization."""
 import pytest
 import pytest_asyncio
-import tempfile
-import os
+import re
 from unittest.mock import patch, AsyncMock
 
 from gpt_to_anki.anki_connect import AnkiConnectDeck
@@ -10,23 +9,51 @@ from gpt_to_anki.database import CardDatabase
 from gpt_to_anki.anki_models import AnkiNoteFeedback
 
 
+def dispatch_multi(handler):
+    """Wrap a per-action mock handler so it also answers `multi` requests."""
+    def side_effect(action, **params):
+        if action == "multi":
+            return [
+                {"result": handler(a["action"], **a["params"]), "error": None}
+                for a in params["actions"]
+            ]
+        return handler(action, **params)
+    return side_effect
+
+
+def query_ids(query):
+    """Return the database ids an AnkiConnect search query asks for."""
+    return {int(i) for i in re.findall(r"\bid:(\d+)", query)}
+
+
+def find_notes(query, note_ids, suspended=(), flags=None):
+    """Answer a findNotes search over {database id: note id}.
+
+    Honours the `is:suspended` and `flag:N` filters used to read card state,
+    with `suspended` holding database ids and `flags` their card flags.
+    """
+    ids = query_ids(query)
+    matches = {i: n for i, n in note_ids.items() if i in ids}
+    if query.startswith("is:suspended "):
+        return [n for i, n in matches.items() if i in suspended]
+    flag = re.match(r"flag:(\d+) ", query)
+    if flag:
+        wanted = int(flag.group(1))
+        return [n for i, n in matches.items() if wanted in (flags or {}).get(i, ())]
+    return list(matches.values())
+
+
 class TestAnkiSyncIntegration:
     """Integration test suite for Anki feedback synchronization."""
 
     @pytest_asyncio.fixture
-    async def db(self):
-        """Create a temporary database for testing."""
-        with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
-            db_path = tmp.name
-        
-        db = CardDatabase(db_path)
+    async def db(self, tmp_path):
+        """Create a temporary on-disk database for testing."""
+        # pytest removes tmp_path with the -wal/-shm files SQLite leaves beside it
+        db = CardDatabase(str(tmp_path / "cards.db"))
         await db.ainit_database()
         yield db
         await db.aclose()
-        
-        # Cleanup
-        if os.path.exists(db_path):
-            os.unlink(db_path)
 
     @pytest.fixture
     def deck(self):
@@ -50,59 +77,40 @@ class TestAnkiSyncIntegration:
             # Setup mock responses for 3 different cards
             def mock_post_side_effect(action, **params):
                 if action == "findNotes":
-                    query = params.get("query", "")
-                    if "id:1" in query:
-                        return [10001]
-                    elif "id:2" in query:
-                        return [10002]
-                    elif "id:3" in query:
-                        return []  # Not found in Anki
-                    return []
+                    # Id 3 is not found in Anki; id 1 has a suspended card
+                    return find_notes(
+                        params.get("query", ""),
+                        {1: 10001, 2: 10002},
+                        suspended={1},
+                        flags={1: {0, 2}, 2: {1}},
+                    )
                 
                 elif action == "notesInfo":
-                    note_ids = params.get("notes", [])
-                    if 10001 in note_ids:
-                        return [{
+                    notes = {
+                        10001: {
                             "noteId": 10001,
                             "modelName": "TestModel",
                             "fields": {
+                                "id": {"value": "1"},
                                 "Front": {"value": "What is Python?"},
                                 "Back": {"value": "A programming language"},
                                 "Topic": {"value": "Programming"}
                             }
-                        }]
-                    elif 10002 in note_ids:
-                        return [{
+                        },
+                        10002: {
                             "noteId": 10002,
                             "modelName": "TestModel",
                             "fields": {
+                                "id": {"value": "2"},
                                 "Front": {"value": "What is async/await?"},
                                 "Back": {"value": "Asynchronous programming syntax"},
                                 "Topic": {"value": "Python"}
                             }
-                        }]
-                    return []
-                
-                elif action == "findCards":
-                    query = params.get("query", "")
-                    if "id:1" in query:
-                        return [20001, 20002]
-                    elif "id:2" in query:
-                        return [20003]
-                    return []
-                
-                elif action == "cardsInfo":
-                    card_ids = params.get("cards", [])
-                    if 20001 in card_ids or 20002 in card_ids:
-                        return [
-                            {"suspended": False, "queue": 1, "flags": 0},
-                            {"suspended": True, "queue": -1, "flags": 2}
-                        ]
-                    elif 20003 in card_ids:
-                        return [{"suspended": False, "queue": 2, "flags": 1}]
-                    return []
+                        },
+                    }
+                    return [notes[n] for n in params.get("notes", []) if n in notes]
             
-            mock_post.side_effect = mock_post_side_effect
+            mock_post.side_effect = dispatch_multi(mock_post_side_effect)
             
             # Fetch feedback from Anki
             feedback_list = await deck.aget_feedback_for_database_ids([1, 2, 3])
@@ -132,15 +140,15 @@ class TestAnkiSyncIntegration:
         await db.asave_anki_feedback(feedback_list)
         
         # Load from database
-        loaded = await db.aload_anki_feedback([1, 2, 3])
+        loaded = await db.aload_anki_feedback_map([1, 2, 3])
         assert len(loaded) == 2  # Only 2 were saved
         
         # Verify loaded data matches
-        loaded_fb1 = next(fb for fb in loaded if fb.database_id == 1)
+        loaded_fb1 = loaded[1]
         assert loaded_fb1.question == "What is Python?"
         assert loaded_fb1.suspended is True
         
-        loaded_fb2 = next(fb for fb in loaded if fb.database_id == 2)
+        loaded_fb2 = loaded[2]
         assert loaded_fb2.question == "What is async/await?"
         assert loaded_fb2.suspended is False
         
@@ -167,24 +175,28 @@ class TestAnkiSyncIntegration:
         
         # Mock updated data from Anki
         with patch.object(deck, '_post') as mock_post:
-            mock_post.side_effect = [
-                [10001],  # findNotes
-                [{  # notesInfo - user edited in Anki
+            responses = {
+                "notesInfo": [{  # user edited in Anki
                     "noteId": 10001,
                     "modelName": "TestModel",
                     "fields": {
+                        "id": {"value": "1"},
                         "Front": {"value": "Updated Question in Anki"},
                         "Back": {"value": "Updated Answer in Anki"},
                         "Topic": {"value": "Updated Topic"}
                     }
                 }],
-                [20001],  # findCards
-                [{  # cardsInfo - user suspended the card
-                    "suspended": True,
-                    "queue": -1,
-                    "flags": 3
-                }]
-            ]
+            }
+
+            def mock_post_side_effect(action, **params):
+                if action == "findNotes":
+                    # User suspended the card and flagged it
+                    return find_notes(
+                        params["query"], {1: 10001}, suspended={1}, flags={1: {3}}
+                    )
+                return responses[action]
+
+            mock_post.side_effect = dispatch_multi(mock_post_side_effect)
             
             # Fetch updated feedback
             updated_feedback = await deck.aget_feedback_for_database_ids([1])
@@ -228,14 +240,10 @@ class TestAnkiSyncIntegration:
         with patch.object(deck, '_post') as mock_post:
             def mock_post_side_effect(action, **params):
                 if action == "findNotes":
-                    query = params.get("query", "")
-                    if "id:1" in query:
-                        return [10001]
-                    elif "id:2" in query:
-                        return []  # Not in Anki
-                    elif "id:3" in query:
-                        return [10003]
-                    return []
+                    # Id 2 is not in Anki
+                    return find_notes(
+                        params.get("query", ""), {1: 10001, 3: 10003}
+                    )
                 
                 elif action == "notesInfo":
                     note_ids = params.get("notes", [])
@@ -244,6 +252,7 @@ class TestAnkiSyncIntegration:
                         result.append({
                             "noteId": 10001,
                             "fields": {
+                                "id": {"value": "1"},
                                 "Front": {"value": "Card 1"},
                                 "Back": {"value": "Answer 1"},
                                 "Topic": {"value": "Topic 1"}
@@ -253,6 +262,7 @@ class TestAnkiSyncIntegration:
                         result.append({
                             "noteId": 10003,
                             "fields": {
+                                "id": {"value": "3"},
                                 "Front": {"value": "Card 3"},
                                 "Back": {"value": "Answer 3"}, 
                                 "Topic": {"value": "Topic 3"}
@@ -260,12 +270,9 @@ class TestAnkiSyncIntegration:
                         })
                     return result
                 
-                elif action == "findCards":
-                    return []  # No cards for simplicity
-                
                 return []
             
-            mock_post.side_effect = mock_post_side_effect
+            mock_post.side_effect = dispatch_multi(mock_post_side_effect)
             
             # Try to sync 3 IDs, but only 2 exist in Anki
             feedback = await deck.aget_feedback_for_database_ids([1, 2, 3])
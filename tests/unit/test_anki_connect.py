@@ -1,12 +1,47 @@
 """Unit tests for AnkiConnectDeck class."""
+import asyncio
 import pytest
-from unittest.mock import AsyncMock, patch, MagicMock
+from unittest.mock import patch
 import aiohttp
+from aiohttp import web
 
-from gpt_to_anki.anki_connect import AnkiConnectDeck
+from gpt_to_anki.anki_connect import (
+    POST_ATTEMPTS,
+    POST_RETRY_DELAY,
+    SEARCH_CHUNK_SIZE,
+    AnkiConnectDeck,
+)
 from gpt_to_anki.anki_models import AnkiNoteFeedback
 
 
+def multi_replies(*results):
+    """Wrap sub-action results the way AnkiConnect's `multi` replies."""
+    return [{"result": result, "error": None} for result in results]
+
+
+class FakeResponse:
+    """Minimal stand-in for the response of `async with session.post(...)`."""
+
+    def __init__(self, data=None, status_error=None):
+        self._data = data
+        self._status_error = status_error
+        self.json_kwargs = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return None
+
+    def raise_for_status(self):
+        if self._status_error is not None:
+            raise self._status_error
+
+    async def json(self, **kwargs):
+        self.json_kwargs = kwargs
+        return self._data
+
+
 class TestAnkiConnectDeck:
     """Test suite for AnkiConnectDeck class."""
 
@@ -50,6 +85,55 @@ class TestAnkiConnectDeck:
         
         await deck.close()
 
+    @pytest.mark.asyncio
+    async def test_injected_session(self):
+        """Test a session passed in is used and left open on close."""
+        async with aiohttp.ClientSession() as shared:
+            deck = AnkiConnectDeck(
+                deck_name="TestDeck", model_name="TestModel", session=shared
+            )
+            assert await deck._ensure_session() is shared
+
+            await deck.close()
+            assert not shared.closed
+
+    @pytest.mark.asyncio
+    async def test_requests_reuse_connection(self):
+        """Test consecutive requests share one keep-alive connection."""
+        peers = []
+
+        async def handle(request):
+            peers.append(request.transport.get_extra_info("peername"))
+            return web.json_response({"result": 6, "error": None})
+
+        app = web.Application()
+        app.router.add_post("/", handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        deck = AnkiConnectDeck(
+            deck_name="TestDeck",
+            model_name="TestModel",
+            endpoint=f"http://127.0.0.1:{port}",
+            connector_limit=4,
+            timeout=5.0,
+        )
+        try:
+            session = await deck._ensure_session()
+            assert session.connector.limit_per_host == 4
+            assert session.timeout.total == 5.0
+
+            for _ in range(3):
+                assert await deck._post("version") == 6
+            assert len(peers) == 3
+            assert len(set(peers)) == 1
+        finally:
+            await deck.close()
+            await runner.cleanup()
+
     @pytest.mark.asyncio
     async def test_context_manager(self, deck):
         """Test async context manager functionality."""
@@ -62,14 +146,48 @@ class TestAnkiConnectDeck:
         assert deck._session.closed
 
     @pytest.mark.asyncio
-    async def test_post_success(self, deck):
+    async def test_post_success(self):
         """Test successful _post method."""
-        mock_response = AsyncMock()
-        mock_response.json = AsyncMock(return_value={"result": "test_result", "error": None})
-        mock_response.raise_for_status = MagicMock()
+        payloads = []
+
+        async def transport(payload):
+            payloads.append(payload)
+            return {"result": "test_result", "error": None}
+
+        deck = AnkiConnectDeck(
+            deck_name="TestDeck", model_name="TestModel", transport=transport
+        )
+
+        result = await deck._post("testAction", param1="value1")
+
+        assert result == "test_result"
+        assert payloads == [
+            {"action": "testAction", "version": 6, "params": {"param1": "value1"}}
+        ]
+        assert deck._session is None  # No HTTP involved
+
+    @pytest.mark.asyncio
+    async def test_post_error(self):
+        """Test _post method with AnkiConnect error."""
+
+        async def transport(payload):
+            return {"result": None, "error": "Test error"}
+
+        deck = AnkiConnectDeck(
+            deck_name="TestDeck", model_name="TestModel", transport=transport
+        )
+
+        with pytest.raises(RuntimeError, match="AnkiConnect error: Test error"):
+            await deck._post("testAction")
+
+    @pytest.mark.asyncio
+    async def test_post_over_http(self, deck):
+        """Test _post sends the payload to the endpoint over HTTP."""
+        response = FakeResponse({"result": "test_result", "error": None})
         
-        with patch.object(aiohttp.ClientSession, 'post') as mock_post:
-            mock_post.return_value.__aenter__.return_value = mock_response
+        with patch.object(
+            aiohttp.ClientSession, 'post', return_value=response
+        ) as mock_post:
             
             result = await deck._post("testAction", param1="value1")
             
@@ -80,162 +198,381 @@ class TestAnkiConnectDeck:
             assert call_args[1]["json"]["action"] == "testAction"
             assert call_args[1]["json"]["version"] == 6
             assert call_args[1]["json"]["params"]["param1"] == "value1"
+            # Replies are decoded whatever JSON content type Anki declares
+            assert response.json_kwargs["content_type"] is None
         
         await deck.close()
 
     @pytest.mark.asyncio
-    async def test_post_error(self, deck):
-        """Test _post method with AnkiConnect error."""
-        mock_response = AsyncMock()
-        mock_response.json = AsyncMock(return_value={"result": None, "error": "Test error"})
-        mock_response.raise_for_status = MagicMock()
+    async def test_post_http_error(self, deck):
+        """Test _post method with HTTP error."""
+        response = FakeResponse(status_error=aiohttp.ClientError("HTTP Error"))
         
-        with patch.object(aiohttp.ClientSession, 'post') as mock_post:
-            mock_post.return_value.__aenter__.return_value = mock_response
-            
-            with pytest.raises(RuntimeError, match="AnkiConnect error: Test error"):
+        with patch.object(aiohttp.ClientSession, 'post', return_value=response):
+            with pytest.raises(aiohttp.ClientError):
                 await deck._post("testAction")
         
         await deck.close()
 
     @pytest.mark.asyncio
-    async def test_post_http_error(self, deck):
-        """Test _post method with HTTP error."""
-        mock_response = AsyncMock()
-        mock_response.raise_for_status = MagicMock(side_effect=aiohttp.ClientError("HTTP Error"))
-        
+    @pytest.mark.looptime
+    async def test_post_retries_with_backoff(self, deck):
+        """Test _post retries connection errors with doubling delays."""
+        loop = asyncio.get_running_loop()
+        start = loop.time()  # Fake time, advanced only by the retry sleeps
+        response = FakeResponse({"result": "ok", "error": None})
+        refused = aiohttp.ClientConnectionError("Connection refused")
+
         with patch.object(aiohttp.ClientSession, 'post') as mock_post:
-            mock_post.return_value.__aenter__.return_value = mock_response
-            
-            with pytest.raises(aiohttp.ClientError):
+            mock_post.side_effect = [refused, refused, refused, response]
+
+            assert await deck._post("testAction") == "ok"
+            assert mock_post.call_count == POST_ATTEMPTS
+            # Waited POST_RETRY_DELAY, then twice and four times as long
+            assert loop.time() - start == pytest.approx(POST_RETRY_DELAY * 7)
+
+            # Gives up once all attempts are used
+            mock_post.reset_mock()
+            mock_post.side_effect = refused
+            with pytest.raises(aiohttp.ClientConnectionError):
                 await deck._post("testAction")
-        
-        await deck.close()
+            assert mock_post.call_count == POST_ATTEMPTS
+            assert loop.time() - start == pytest.approx(POST_RETRY_DELAY * 14)
 
-    def test_build_search_for_id(self, deck):
-        """Test _build_search_for_id method."""
-        query = deck._build_search_for_id(123)
-        assert query == 'deck:"TestDeck" note:"TestModel" id:123'
+        await deck.close()
 
     @pytest.mark.asyncio
-    async def test_fetch_single_feedback_success(self, deck):
-        """Test successful _fetch_single_feedback."""
-        # Mock the _post responses
-        with patch.object(deck, '_post') as mock_post:
-            # Setup mock responses for each call
+    @pytest.mark.looptime
+    async def test_post_timeouts(self, deck):
+        """Test a connect timeout is retried but a spent request budget is not."""
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        response = FakeResponse({"result": "ok", "error": None})
+
+        with patch.object(aiohttp.ClientSession, 'post') as mock_post:
             mock_post.side_effect = [
-                [12345],  # findNotes response
-                [{  # notesInfo response
-                    "noteId": 12345,
-                    "modelName": "TestModel",
-                    "fields": {
-                        "Front": {"value": "Test question"},
-                        "Back": {"value": "Test answer"},
-                        "Topic": {"value": "Test topic"}
-                    }
-                }],
-                [54321, 54322],  # findCards response
-                [{  # cardsInfo response
-                    "suspended": False,
-                    "queue": 1,
-                    "flags": 2
-                }, {
-                    "suspended": True,
-                    "queue": -1,
-                    "flags": 1
-                }]
+                aiohttp.ConnectionTimeoutError("Connection timeout"),
+                response,
             ]
-            
-            result = await deck._fetch_single_feedback(123)
-            
-            assert isinstance(result, AnkiNoteFeedback)
-            assert result.database_id == 123
-            assert result.anki_note_id == 12345
-            assert result.deck_name == "TestDeck"
-            assert result.model_name == "TestModel"
-            assert result.question == "Test question"
-            assert result.answer == "Test answer"
-            assert result.topic == "Test topic"
-            assert result.suspended is True  # One card is suspended
-            assert result.flag == 2  # Max flag value
-        
+            assert await deck._post("testAction") == "ok"
+            assert loop.time() - start == pytest.approx(POST_RETRY_DELAY)
+
+            mock_post.reset_mock()
+            mock_post.side_effect = asyncio.TimeoutError()
+            with pytest.raises(asyncio.TimeoutError):
+                await deck._post("testAction")
+            assert mock_post.call_count == 1
+            assert loop.time() - start == pytest.approx(POST_RETRY_DELAY)
+
+        await deck.close()
+
+    @pytest.mark.asyncio
+    async def test_fetch_single_feedback(self, deck):
+        """Test _fetch_single_feedback goes through the batched fetch."""
+        feedback = AnkiNoteFeedback(
+            database_id=123,
+            anki_note_id=12345,
+            deck_name="TestDeck",
+            model_name="TestModel",
+            question="Q",
+            answer="A",
+        )
+
+        with patch.object(deck, '_fetch_batch_feedback') as mock_fetch:
+            mock_fetch.return_value = [feedback]
+            assert await deck._fetch_single_feedback(123) == feedback
+            mock_fetch.assert_called_once_with([123])
+
+            # No note for the id in Anki
+            mock_fetch.return_value = []
+            assert await deck._fetch_single_feedback(123) is None
+
         await deck.close()
 
+    def test_build_search_for_ids(self, deck):
+        """Test _build_search_for_ids method."""
+        query = deck._build_search_for_ids([1, 2])
+        assert query == 'deck:"TestDeck" note:"TestModel" (id:1 OR id:2)'
+
+    def test_model_construct_matches_validate(self, deck):
+        """Test _to_feedback builds the same model validation would."""
+        note = {
+            "noteId": 10001,
+            "modelName": "TestModel",
+            "fields": {
+                "id": {"value": "1"},
+                "Front": {"value": "Q1"},
+                "Back": {"value": "A1"},
+            },
+        }
+
+        constructed = deck._to_feedback(1, note, suspended=True, flag=2)
+        validated = AnkiNoteFeedback.model_validate(constructed.model_dump())
+
+        assert constructed == validated
+        assert constructed.model_fields_set == validated.model_fields_set
+        assert constructed.topic == ""  # Missing field falls back to empty
+
     @pytest.mark.asyncio
-    async def test_fetch_single_feedback_no_note(self, deck):
-        """Test _fetch_single_feedback when note is not found."""
+    async def test_awarmup(self, deck):
+        """Test awarmup pings AnkiConnect and tolerates it being down."""
         with patch.object(deck, '_post') as mock_post:
-            mock_post.return_value = []  # Empty findNotes response
-            
-            result = await deck._fetch_single_feedback(123)
-            assert result is None
-        
+            await deck.awarmup()
+            mock_post.assert_called_once_with("version")
+
+            mock_post.side_effect = aiohttp.ClientConnectionError()
+            await deck.awarmup()  # Should not raise
+
         await deck.close()
 
     @pytest.mark.asyncio
-    async def test_fetch_single_feedback_no_cards(self, deck):
-        """Test _fetch_single_feedback when no cards exist."""
+    async def test_post_multi(self, deck):
+        """Test _post_multi unwraps each sub-action result."""
         with patch.object(deck, '_post') as mock_post:
-            mock_post.side_effect = [
-                [12345],  # findNotes
-                [{  # notesInfo
-                    "noteId": 12345,
-                    "fields": {
-                        "Front": {"value": "Question"},
-                        "Back": {"value": "Answer"},
-                        "Topic": {"value": "Topic"}
-                    }
-                }],
-                [],  # No cards found
+            mock_post.return_value = [
+                {"result": [1, 2], "error": None},
+                {"result": [], "error": None},
             ]
-            
-            result = await deck._fetch_single_feedback(123)
-            
-            assert result is not None
-            assert result.suspended is False
-            assert result.flag == 0
-        
+
+            actions = [
+                deck._action("findNotes", query="a"),
+                deck._action("findCards", query="b"),
+            ]
+            results = await deck._post_multi(actions)
+
+            assert results == [[1, 2], []]
+            mock_post.assert_called_once_with("multi", actions=actions)
+
+        await deck.close()
+
+    @pytest.mark.asyncio
+    async def test_post_multi_sub_action_error(self, deck):
+        """Test _post_multi raises when a sub-action fails."""
+        with patch.object(deck, '_post') as mock_post:
+            mock_post.return_value = [
+                {"result": None, "error": "collection is not available"},
+            ]
+
+            with pytest.raises(RuntimeError, match="collection is not available"):
+                await deck._post_multi([deck._action("findNotes", query="a")])
+
         await deck.close()
 
     @pytest.mark.asyncio
     async def test_aget_feedback_for_database_ids(self, deck):
-        """Test aget_feedback_for_database_ids method."""
-        # Create mock feedback objects
-        feedback1 = AnkiNoteFeedback(
+        """Test aget_feedback_for_database_ids batches all ids into two requests."""
+        def ok(result):
+            return {"result": result, "error": None}
+
+        search_replies = [
+            ok([10001, 10003]),  # findNotes for ids 1, 2, 3 in one search
+            ok([10003]),  # is:suspended
+            ok([10003]),  # flag:1
+            ok([]),  # flag:2
+            ok([10003]),  # flag:3
+            ok([]), ok([]), ok([]), ok([]),  # flag:4 .. flag:7
+        ]
+        notes_info = [
+            {
+                "noteId": 10001,
+                "modelName": "TestModel",
+                "fields": {
+                    "id": {"value": "1"},
+                    "Front": {"value": "Q1"},
+                    "Back": {"value": "A1"},
+                    "Topic": {"value": "T1"},
+                },
+            },
+            {
+                "noteId": 10003,
+                "modelName": "TestModel",
+                "fields": {
+                    "id": {"value": "3"},
+                    "Front": {"value": "Q3"},
+                    "Back": {"value": "A3"},
+                    "Topic": {"value": "T3"},
+                },
+            },
+        ]
+
+        with patch.object(deck, '_post') as mock_post:
+            mock_post.side_effect = [search_replies, notes_info]
+
+            results = await deck.aget_feedback_for_database_ids([1, 2, 3])
+
+            assert len(results) == 2  # Id 2 has no note in Anki
+            assert results[0].database_id == 1
+            assert results[0].question == "Q1"
+            assert results[0].suspended is False
+            assert results[0].flag == 0
+            assert results[1].database_id == 3
+            assert results[1].question == "Q3"
+            assert results[1].suspended is True
+            assert results[1].flag == 3  # Highest flag wins
+
+            # Two round-trips regardless of the number of ids
+            assert mock_post.call_count == 2
+            assert mock_post.call_args_list[0][0][0] == "multi"
+            search_actions = mock_post.call_args_list[0][1]["actions"]
+            assert {a["action"] for a in search_actions} == {"findNotes"}
+            query = 'deck:"TestDeck" note:"TestModel" (id:1 OR id:2 OR id:3)'
+            assert [a["params"]["query"] for a in search_actions] == [
+                query,
+                f"is:suspended {query}",
+                *(f"flag:{flag} {query}" for flag in range(1, 8)),
+            ]
+            mock_post.assert_called_with("notesInfo", notes=[10001, 10003])
+
+        await deck.close()
+
+    @pytest.mark.asyncio
+    async def test_aget_feedback_chunks_large_searches(self, deck):
+        """Test that many ids are split into several searches in one request."""
+        with patch.object(deck, '_post') as mock_post:
+            mock_post.return_value = [{"result": [], "error": None}] * 18
+
+            results = await deck.aget_feedback_for_database_ids(
+                list(range(SEARCH_CHUNK_SIZE + 1))
+            )
+
+            assert results == []
+            mock_post.assert_called_once()
+            search_actions = mock_post.call_args[1]["actions"]
+            assert len(search_actions) == 18
+            assert search_actions[9]["params"]["query"].endswith(
+                f"(id:{SEARCH_CHUNK_SIZE})"
+            )
+
+        await deck.close()
+
+    @pytest.mark.asyncio
+    async def test_aget_feedback_for_100_ids(self, deck):
+        """Test that 100 ids still take exactly two round-trips."""
+        ids = list(range(1, 101))
+        note_ids = [10000 + db_id for db_id in ids]
+        search_replies = [{"result": note_ids, "error": None}] + [
+            {"result": [], "error": None}
+        ] * 8
+        notes_info = [
+            {
+                "noteId": 10000 + db_id,
+                "modelName": "TestModel",
+                "fields": {
+                    "id": {"value": str(db_id)},
+                    "Front": {"value": f"Q{db_id}"},
+                    "Back": {"value": f"A{db_id}"},
+                    "Topic": {"value": "T"},
+                },
+            }
+            for db_id in ids
+        ]
+
+        with patch.object(deck, '_post') as mock_post:
+            mock_post.side_effect = [search_replies, notes_info]
+
+            results = await deck.aget_feedback_for_database_ids(ids)
+
+            assert [fb.database_id for fb in results] == ids
+            assert [fb.anki_note_id for fb in results] == note_ids
+            assert mock_post.call_count == 2
+            mock_post.assert_called_with("notesInfo", notes=note_ids)
+
+        await deck.close()
+
+    @pytest.mark.asyncio
+    async def test_aget_feedback_deduplicates_ids(self, deck):
+        """Test that repeated ids are searched for and returned once."""
+        notes_info = [
+            {
+                "noteId": 10000 + db_id,
+                "modelName": "TestModel",
+                "fields": {"id": {"value": str(db_id)}, "Front": {"value": "Q"}},
+            }
+            for db_id in (3, 1)
+        ]
+        search_replies = [{"result": [10003, 10001], "error": None}] + [
+            {"result": [], "error": None}
+        ] * 8
+
+        with patch.object(deck, '_post') as mock_post:
+            mock_post.side_effect = [search_replies, notes_info]
+
+            results = await deck.aget_feedback_for_database_ids([3, 1, 3, 1])
+
+            assert [fb.database_id for fb in results] == [3, 1]
+            query = mock_post.call_args_list[0][1]["actions"][0]["params"]["query"]
+            assert query.endswith("(id:3 OR id:1)")
+
+        await deck.close()
+
+    @pytest.mark.asyncio
+    async def test_aget_feedback_for_empty_ids(self, deck):
+        """Test aget_feedback_for_database_ids does not call Anki for no ids."""
+        with patch.object(deck, '_post') as mock_post:
+            results = await deck.aget_feedback_for_database_ids([])
+
+            assert results == []
+            mock_post.assert_not_called()
+
+        await deck.close()
+
+    @pytest.mark.asyncio
+    async def test_aget_feedback_uses_cache(self, deck):
+        """Test that ids fetched within cache_ttl are not fetched again."""
+        feedback = AnkiNoteFeedback(
             database_id=1,
             anki_note_id=10001,
             deck_name="TestDeck",
             model_name="TestModel",
             question="Q1",
             answer="A1",
-            topic="T1",
-            suspended=False,
-            flag=0
-        )
-        feedback2 = AnkiNoteFeedback(
-            database_id=2,
-            anki_note_id=10002,
-            deck_name="TestDeck",
-            model_name="TestModel",
-            question="Q2",
-            answer="A2",
-            topic="T2",
-            suspended=True,
-            flag=1
         )
-        
-        with patch.object(deck, '_fetch_single_feedback') as mock_fetch:
-            mock_fetch.side_effect = [feedback1, None, feedback2]  # Second ID returns None
-            
-            results = await deck.aget_feedback_for_database_ids([1, 2, 3])
-            
-            assert len(results) == 2  # None is filtered out
-            assert results[0] == feedback1
-            assert results[1] == feedback2
-            
-            # Verify all IDs were queried
-            assert mock_fetch.call_count == 3
-        
+
+        with patch.object(deck, '_fetch_batch_feedback') as mock_fetch:
+            mock_fetch.return_value = [feedback]
+
+            assert await deck.aget_feedback_for_database_ids([1, 2]) == [feedback]
+            assert await deck.aget_feedback_for_database_ids([1, 2]) == [feedback]
+
+            # Id 2 is remembered as missing from Anki, so nothing is re-fetched
+            mock_fetch.assert_called_once_with([1, 2])
+
+            deck.cache_ttl = 0
+            await deck.aget_feedback_for_database_ids([1, 2])
+            assert mock_fetch.call_args_list[1][0][0] == [1, 2]
+
+        await deck.close()
+
+    @pytest.mark.asyncio
+    async def test_aget_feedback_cache_is_bounded(self, deck):
+        """Test the cache drops expired entries and stays within its size."""
+        deck.cache_max_entries = 3
+
+        with patch.object(deck, '_fetch_batch_feedback') as mock_fetch:
+            mock_fetch.return_value = []
+
+            await deck.aget_feedback_for_database_ids([1, 2])
+            await deck.aget_feedback_for_database_ids([3, 4])
+            # Oldest ids are evicted first
+            assert list(deck._cache) == [2, 3, 4]
+
+            deck.cache_ttl = 0
+            await deck.aget_feedback_for_database_ids([5])
+            # Everything, including the new entry, has expired
+            assert deck._cache == {}
+
+        await deck.close()
+
+    @pytest.mark.asyncio
+    async def test_aget_feedback_error_is_not_cached(self, deck):
+        """Test that a failed fetch does not mark ids as missing from Anki."""
+        with patch.object(deck, '_fetch_batch_feedback') as mock_fetch:
+            mock_fetch.side_effect = [RuntimeError("AnkiConnect error"), []]
+
+            assert await deck.aget_feedback_for_database_ids([1]) == []
+            assert await deck.aget_feedback_for_database_ids([1]) == []
+            assert mock_fetch.call_count == 2
+
         await deck.close()
 
     @pytest.mark.asyncio
@@ -253,23 +590,42 @@ class TestAnkiConnectDeck:
         await deck.close()
 
     @pytest.mark.asyncio
-    async def test_invalid_flag_handling(self, deck):
-        """Test handling of invalid flag values."""
+    async def test_default_field_map_resolved_once(self):
+        """Test default field map is matched against the note type's fields."""
+        deck = AnkiConnectDeck(deck_name="Test", model_name="Basic")
+
         with patch.object(deck, '_post') as mock_post:
             mock_post.side_effect = [
-                [12345],  # findNotes
-                [{  # notesInfo
-                    "noteId": 12345,
-                    "fields": {"Front": {"value": "Q"}, "Back": {"value": "A"}}
+                [  # modelFieldNames rides along with the first search
+                    {"result": ["id", "Front", "Back"], "error": None},
+                    {"result": [10001], "error": None},
+                    *[{"result": [], "error": None}] * 8,
+                ],
+                [{
+                    "noteId": 10001,
+                    "fields": {
+                        "id": {"value": "1"},
+                        "Front": {"value": "Q"},
+                        "Back": {"value": "A"},
+                    },
                 }],
-                [54321],  # findCards
-                [{  # cardsInfo with invalid flag
-                    "suspended": False,
-                    "flags": "invalid"  # Non-integer flag
-                }]
+                [{"result": [], "error": None}] * 9,
             ]
-            
-            result = await deck._fetch_single_feedback(123)
-            assert result.flag == 0  # Should default to 0
-        
-        await deck.close()
\ No newline at end of file
+
+            results = await deck.aget_feedback_for_database_ids([1])
+            assert results[0].question == "Q"
+            assert results[0].answer == "A"
+            assert deck.field_map == {
+                "question": "Front",
+                "answer": "Back",
+                "topic": "Topic",
+            }
+            first_actions = mock_post.call_args_list[0][1]["actions"]
+            assert first_actions[0]["action"] == "modelFieldNames"
+
+            await deck.aget_feedback_for_database_ids([2])
+            later_actions = mock_post.call_args_list[2][1]["actions"]
+            assert len(later_actions) == 9
+            assert {a["action"] for a in later_actions} == {"findNotes"}
+
+        await deck.close()
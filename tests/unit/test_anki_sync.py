@@ -1,55 +1,63 @@
 """Unit tests for anki_sync module."""
 import pytest
-from unittest.mock import AsyncMock, MagicMock
+from typing import List
 
 from gpt_to_anki.anki_sync import sync_feedback_for_context
 from gpt_to_anki.anki_base import AbstractAnkiDeck
-from gpt_to_anki.database import CardDatabase
-from gpt_to_anki.data_objects import Card
 from gpt_to_anki.anki_models import AnkiNoteFeedback
 
 
+class FakeDeck(AbstractAnkiDeck):
+    """Deck returning canned feedback and recording the ids asked for."""
+
+    def __init__(self):
+        self.feedback: List[AnkiNoteFeedback] = []
+        self.calls: List[List[int]] = []
+        self.warmups = 0
+
+    async def awarmup(self) -> None:
+        self.warmups += 1
+
+    async def aget_feedback_for_database_ids(self, database_ids):
+        self.calls.append(database_ids)
+        return self.feedback
+
+
+class FakeDatabase:
+    """Database holding card ids in memory and recording saved feedback."""
+
+    def __init__(self):
+        self.database_ids: List[int] = []
+        self.loaded_contexts: List[str] = []
+        self.saved: List[List[AnkiNoteFeedback]] = []
+
+    async def aload_database_ids(self, context):
+        self.loaded_contexts.append(context)
+        return self.database_ids
+
+    async def asave_anki_feedback(self, feedback_list):
+        self.saved.append(feedback_list)
+        return {fb.database_id: 0 for fb in feedback_list}
+
+
 class TestAnkiSync:
     """Test suite for anki_sync functions."""
 
     @pytest.fixture
-    def mock_deck(self):
-        """Create a mock AnkiDeck."""
-        deck = MagicMock(spec=AbstractAnkiDeck)
-        deck.aget_feedback_for_database_ids = AsyncMock()
-        return deck
+    def fake_deck(self):
+        """Create a fake AnkiDeck."""
+        return FakeDeck()
 
     @pytest.fixture
-    def mock_db(self):
-        """Create a mock CardDatabase."""
-        db = MagicMock(spec=CardDatabase)
-        db.aload_cards = AsyncMock()
-        db.asave_anki_feedback = AsyncMock()
-        return db
+    def fake_db(self):
+        """Create a fake CardDatabase."""
+        return FakeDatabase()
 
     @pytest.mark.asyncio
-    async def test_sync_feedback_success(self, mock_deck, mock_db):
+    async def test_sync_feedback_success(self, fake_deck, fake_db):
         """Test successful feedback sync for a context."""
-        # Mock cards in the database
-        cards = [
-            Card(
-                database_id=1,
-                question="Q1",
-                answer="A1",
-                context="test_context",
-                topic="Topic1",
-                evaluation="good"
-            ),
-            Card(
-                database_id=2,
-                question="Q2",
-                answer="A2",
-                context="test_context",
-                topic="Topic2",
-                evaluation="good"
-            ),
-        ]
-        mock_db.aload_cards.return_value = cards
+        # Mock card ids in the database
+        fake_db.database_ids = [1, 2]
 
         # Mock feedback from Anki
         feedback = [
@@ -76,80 +84,45 @@ class TestAnkiSync:
                 flag=0
             ),
         ]
-        mock_deck.aget_feedback_for_database_ids.return_value = feedback
+        fake_deck.feedback = feedback
 
         # Run sync
-        result = await sync_feedback_for_context(mock_deck, mock_db, "test_context")
+        result = await sync_feedback_for_context(fake_deck, fake_db, "test_context")
 
         # Verify
         assert result == 2
-        mock_db.aload_cards.assert_called_once_with("test_context")
-        mock_deck.aget_feedback_for_database_ids.assert_called_once_with([1, 2])
-        mock_db.asave_anki_feedback.assert_called_once_with(feedback)
+        assert fake_db.loaded_contexts == ["test_context"]
+        assert fake_deck.warmups == 1
+        assert fake_deck.calls == [[1, 2]]
+        assert fake_db.saved == [feedback]
 
     @pytest.mark.asyncio
-    async def test_sync_feedback_no_cards(self, mock_deck, mock_db):
+    async def test_sync_feedback_no_cards(self, fake_deck, fake_db):
         """Test sync when no cards exist for context."""
-        mock_db.aload_cards.return_value = []
+        fake_db.database_ids = []
 
-        result = await sync_feedback_for_context(mock_deck, mock_db, "empty_context")
+        result = await sync_feedback_for_context(fake_deck, fake_db, "empty_context")
 
         assert result == 0
-        mock_db.aload_cards.assert_called_once_with("empty_context")
-        mock_deck.aget_feedback_for_database_ids.assert_not_called()
-        mock_db.asave_anki_feedback.assert_not_called()
+        assert fake_db.loaded_contexts == ["empty_context"]
+        assert fake_deck.calls == []
+        assert fake_db.saved == []
 
     @pytest.mark.asyncio
-    async def test_sync_feedback_cards_without_ids(self, mock_deck, mock_db):
-        """Test sync when cards don't have database IDs."""
-        cards = [
-            Card(
-                database_id=None,  # No ID
-                question="Q1",
-                answer="A1",
-                context="test_context",
-                topic="Topic1",
-                evaluation="good"
-            ),
-        ]
-        mock_db.aload_cards.return_value = cards
-
-        result = await sync_feedback_for_context(mock_deck, mock_db, "test_context")
-
-        assert result == 0
-        mock_deck.aget_feedback_for_database_ids.assert_not_called()
-        mock_db.asave_anki_feedback.assert_not_called()
-
-    @pytest.mark.asyncio
-    async def test_sync_feedback_no_anki_feedback(self, mock_deck, mock_db):
+    async def test_sync_feedback_no_anki_feedback(self, fake_deck, fake_db):
         """Test sync when Anki returns no feedback."""
-        cards = [
-            Card(
-                database_id=1,
-                question="Q1",
-                answer="A1",
-                context="test_context",
-                topic="Topic1",
-                evaluation="good"
-            ),
-        ]
-        mock_db.aload_cards.return_value = cards
-        mock_deck.aget_feedback_for_database_ids.return_value = []
+        fake_db.database_ids = [1]
+        fake_deck.feedback = []
 
-        result = await sync_feedback_for_context(mock_deck, mock_db, "test_context")
+        result = await sync_feedback_for_context(fake_deck, fake_db, "test_context")
 
         assert result == 0
-        mock_db.asave_anki_feedback.assert_not_called()
+        assert fake_db.saved == []
 
     @pytest.mark.asyncio
-    async def test_sync_feedback_partial_results(self, mock_deck, mock_db):
+    async def test_sync_feedback_partial_results(self, fake_deck, fake_db):
         """Test sync when only some cards have feedback in Anki."""
-        cards = [
-            Card(database_id=1, question="Q1", answer="A1", context="test", topic="T1", evaluation="good"),
-            Card(database_id=2, question="Q2", answer="A2", context="test", topic="T2", evaluation="good"),
-            Card(database_id=3, question="Q3", answer="A3", context="test", topic="T3", evaluation="good"),
-        ]
-        mock_db.aload_cards.return_value = cards
+        fake_db.database_ids = [1, 2, 3]
 
         # Only feedback for cards 1 and 3
         feedback = [
@@ -172,25 +145,19 @@ class TestAnkiSync:
                 topic="T3",
             ),
         ]
-        mock_deck.aget_feedback_for_database_ids.return_value = feedback
+        fake_deck.feedback = feedback
 
-        result = await sync_feedback_for_context(mock_deck, mock_db, "test")
+        result = await sync_feedback_for_context(fake_deck, fake_db, "test")
 
         assert result == 2
-        mock_deck.aget_feedback_for_database_ids.assert_called_once_with([1, 2, 3])
-        mock_db.asave_anki_feedback.assert_called_once_with(feedback)
+        assert fake_deck.calls == [[1, 2, 3]]
+        assert fake_db.saved == [feedback]
 
     @pytest.mark.asyncio
-    async def test_sync_feedback_mixed_ids(self, mock_deck, mock_db):
-        """Test sync with mix of cards with and without database IDs."""
-        cards = [
-            Card(database_id=1, question="Q1", answer="A1", context="test", topic="T1", evaluation="good"),
-            Card(database_id=None, question="Q2", answer="A2", context="test", topic="T2", evaluation="good"),
-            Card(database_id=3, question="Q3", answer="A3", context="test", topic="T3", evaluation="good"),
-        ]
-        mock_db.aload_cards.return_value = cards
-
-        feedback = [
+    async def test_sync_feedback_save_failure(self, fake_deck, fake_db):
+        """Test a failed save is not reported as synced rows."""
+        fake_db.database_ids = [1]
+        fake_deck.feedback = [
             AnkiNoteFeedback(
                 database_id=1,
                 anki_note_id=10001,
@@ -198,14 +165,13 @@ class TestAnkiSync:
                 model_name="TestModel",
                 question="Q1",
                 answer="A1",
-                topic="T1",
             ),
         ]
-        mock_deck.aget_feedback_for_database_ids.return_value = feedback
 
-        result = await sync_feedback_for_context(mock_deck, mock_db, "test")
+        async def fail(feedback_list):
+            raise RuntimeError("database is locked")
+
+        fake_db.asave_anki_feedback = fail
 
-        assert result == 1
-        # Should only query for cards with IDs
-        mock_deck.aget_feedback_for_database_ids.assert_called_once_with([1, 3])
-        mock_db.asave_anki_feedback.assert_called_once_with(feedback)
\ No newline at end of file
+        with pytest.raises(RuntimeError, match="database is locked"):
+            await sync_feedback_for_context(fake_deck, fake_db, "test")
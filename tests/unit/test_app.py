@@ -0,0 +1,256 @@
+"""Unit tests for the Gradio app's state and document helpers."""
+import asyncio
+import os
+from typing import Dict, List, Optional
+
+import pytest
+
+from gpt_to_anki import app
+from gpt_to_anki.app import (
+    EVALUATION_FLUSH_DELAY,
+    EVALUATION_FLUSH_MAX,
+    EVALUATION_RETRY_DELAY,
+    AppState,
+)
+from gpt_to_anki.data_objects import Card
+
+
+class FakeEvaluationDatabase:
+    """Records evaluation writes; can hold a write open or fail it."""
+
+    def __init__(self):
+        self.writes: List[Dict[int, str]] = []
+        self.failures = 0
+        # When set, writes wait for it before finishing
+        self.gate: Optional[asyncio.Event] = None
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.closed = False
+        self.writes_after_close = 0
+
+    async def aupdate_card_evaluations(self, evaluations):
+        if self.closed:
+            self.writes_after_close += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.gate is not None:
+                await self.gate.wait()
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError("database is locked")
+            self.writes.append(dict(evaluations))
+        finally:
+            self.in_flight -= 1
+
+    async def aclose(self):
+        self.closed = True
+
+
+def card(database_id: int, evaluation: str) -> Card:
+    return Card(
+        question="Q",
+        answer="A",
+        database_id=database_id,
+        evaluation=evaluation,
+    )
+
+
+class TestEvaluationWriteBehind:
+    """Test suite for AppState's batched evaluation writes."""
+
+    @pytest.fixture
+    def state(self):
+        state = AppState()
+        state.db = FakeEvaluationDatabase()
+        return state
+
+    @pytest.mark.asyncio
+    @pytest.mark.looptime
+    async def test_writes_after_delay_in_one_batch(self, state):
+        """Test evaluations queued together are saved with one write."""
+        state.queue_evaluation_write(card(1, "liked"))
+        state.queue_evaluation_write(card(2, "seen"))
+        state.queue_evaluation_write(card(1, "disliked"))
+        assert state.db.writes == []
+
+        await asyncio.sleep(EVALUATION_FLUSH_DELAY + 0.1)
+
+        assert state.db.writes == [{1: "disliked", 2: "seen"}]
+
+    @pytest.mark.asyncio
+    @pytest.mark.looptime
+    async def test_rating_during_flush_is_saved(self, state):
+        """Test a rating queued while a write is in flight gets its own write."""
+        state.db.gate = asyncio.Event()
+        state.queue_evaluation_write(card(1, "liked"))
+        await asyncio.sleep(EVALUATION_FLUSH_DELAY + 0.1)
+        assert state.db.in_flight == 1
+
+        state.queue_evaluation_write(card(2, "disliked"))
+        state.db.gate.set()
+        await asyncio.sleep(EVALUATION_FLUSH_DELAY + 0.1)
+
+        assert state.db.writes == [{1: "liked"}, {2: "disliked"}]
+        assert state._pending_evaluations == {}
+
+    @pytest.mark.asyncio
+    @pytest.mark.looptime
+    async def test_full_batch_does_not_overlap_writes(self, state):
+        """Test reaching EVALUATION_FLUSH_MAX reuses the one flush task."""
+        state.db.gate = asyncio.Event()
+        state.queue_evaluation_write(card(0, "seen"))
+        await asyncio.sleep(EVALUATION_FLUSH_DELAY + 0.1)
+        flush_task = state._flush_task
+
+        # A full batch arrives while the first write is still open
+        for card_id in range(1, EVALUATION_FLUSH_MAX + 1):
+            state.queue_evaluation_write(card(card_id, "liked"))
+        assert state._flush_task is flush_task
+        state.db.gate.set()
+        # Well short of EVALUATION_FLUSH_DELAY: the full batch skips the wait
+        await asyncio.sleep(0.01)
+
+        assert state.db.max_in_flight == 1
+        assert len(state.db.writes) == 2
+        assert len(state.db.writes[1]) == EVALUATION_FLUSH_MAX
+
+    @pytest.mark.asyncio
+    @pytest.mark.looptime
+    async def test_failed_write_is_retried(self, state):
+        """Test a failed write is tried again after EVALUATION_RETRY_DELAY."""
+        state.db.failures = 1
+        state.queue_evaluation_write(card(1, "liked"))
+
+        await asyncio.sleep(EVALUATION_FLUSH_DELAY + 0.1)
+        assert state.db.writes == []
+        assert state._pending_evaluations == {1: "liked"}
+
+        await asyncio.sleep(EVALUATION_RETRY_DELAY)
+        assert state.db.writes == [{1: "liked"}]
+        assert state._pending_evaluations == {}
+
+    @pytest.mark.asyncio
+    @pytest.mark.looptime
+    async def test_aclose_flushes_and_stops_writing(self, state):
+        """Test aclose saves what is pending and nothing is written later."""
+        state.queue_evaluation_write(card(1, "liked"))
+
+        await state.aclose()
+
+        assert state.db.writes == [{1: "liked"}]
+        assert state.db.closed
+        # Late clicks are dropped rather than written to a closed database
+        state.queue_evaluation_write(card(2, "seen"))
+        await asyncio.sleep(EVALUATION_RETRY_DELAY * 2)
+        assert state.db.writes == [{1: "liked"}]
+        assert state.db.writes_after_close == 0
+
+    @pytest.mark.asyncio
+    @pytest.mark.looptime
+    async def test_aclose_during_write(self, state):
+        """Test aclose interrupting an open write still saves its batch."""
+        state.db.gate = asyncio.Event()
+        state.queue_evaluation_write(card(1, "liked"))
+        await asyncio.sleep(EVALUATION_FLUSH_DELAY + 0.1)
+
+        state.db.gate.set()
+        await state.aclose()
+
+        assert state.db.writes[-1] == {1: "liked"}
+        assert state.db.writes_after_close == 0
+
+
+class TestPdfTextCache:
+    """Test suite for read_pdf_text's on-disk extraction cache."""
+
+    @pytest.fixture
+    def extractions(self, tmp_path, monkeypatch):
+        """Paths passed to the real extractor, which is replaced."""
+        calls: List[str] = []
+
+        def fake_extract(file_path):
+            calls.append(file_path)
+            with open(file_path, "rb") as f:
+                return f"text of {f.read().decode()}"
+
+        monkeypatch.setattr(app, "TEXT_CACHE_FOLDER", str(tmp_path / "cache"))
+        monkeypatch.setattr(app, "extract_pdf_text", fake_extract)
+        return calls
+
+    @staticmethod
+    def write(path, content: str) -> str:
+        path.write_bytes(content.encode())
+        return str(path)
+
+    def test_same_bytes_extracted_once(self, tmp_path, extractions):
+        """Test a second read of identical bytes skips extraction."""
+        first = self.write(tmp_path / "a.pdf", "one")
+        # Same bytes under another name hit the same entry
+        copy = self.write(tmp_path / "b.pdf", "one")
+
+        assert app.read_pdf_text(first) == "text of one"
+        assert app.read_pdf_text(copy) == "text of one"
+        assert extractions == [first]
+
+    def test_cache_stays_bounded(self, tmp_path, extractions, monkeypatch):
+        """Test the least recently read entry is evicted past the limit."""
+        monkeypatch.setattr(app, "TEXT_CACHE_MAX_ENTRIES", 2)
+        paths = [self.write(tmp_path / f"{i}.pdf", str(i)) for i in range(3)]
+        cache = tmp_path / "cache"
+
+        app.read_pdf_text(paths[0])
+        app.read_pdf_text(paths[1])
+        # Age both entries, then read the first again to make it recent
+        for entry in cache.glob("*.txt.z"):
+            os.utime(entry, (1, 1))
+        app.read_pdf_text(paths[0])
+        app.read_pdf_text(paths[2])
+
+        assert len(list(cache.glob("*.txt.z"))) == 2
+        extractions.clear()
+        app.read_pdf_text(paths[0])
+        app.read_pdf_text(paths[2])
+        assert extractions == []
+        app.read_pdf_text(paths[1])
+        assert extractions == [paths[1]]
+
+
+class TestSaveUploadedFile:
+    """Test suite for content-addressed uploads."""
+
+    @pytest.fixture(autouse=True)
+    def in_tmp_path(self, tmp_path, monkeypatch):
+        # Uploads land in ./media
+        monkeypatch.chdir(tmp_path)
+
+    @staticmethod
+    def upload(tmp_path, name: str, content: bytes) -> str:
+        path = tmp_path / name
+        path.write_bytes(content)
+        return str(path)
+
+    def test_same_bytes_same_path(self, tmp_path):
+        """Test re-uploading identical bytes reuses the saved file."""
+        saved = app.save_uploaded_file(self.upload(tmp_path, "a.pdf", b"same"))
+        before = os.stat(saved)
+
+        again = app.save_uploaded_file(self.upload(tmp_path, "b.pdf", b"same"))
+
+        assert again == saved
+        after = os.stat(saved)
+        # The first copy was kept, not overwritten
+        assert (after.st_ino, after.st_mtime_ns) == (before.st_ino, before.st_mtime_ns)
+        assert sorted(os.listdir("media")) == [os.path.basename(saved)]
+
+    def test_different_bytes_different_paths(self, tmp_path):
+        """Test different content is saved as separate files."""
+        first = app.save_uploaded_file(self.upload(tmp_path, "a.pdf", b"one"))
+        second = app.save_uploaded_file(self.upload(tmp_path, "a.pdf", b"two"))
+
+        assert first != second
+        with open(first, "rb") as f:
+            assert f.read() == b"one"
+        with open(second, "rb") as f:
+            assert f.read() == b"two"
+        assert first.endswith(".pdf") and second.endswith(".pdf")
@@ -0,0 +1,304 @@
+"""Unit tests for CardGenerator and its caches."""
+import math
+from typing import Dict, List
+
+import dspy
+import pytest
+
+from gpt_to_anki.cards_generator import BATCH_SIZE, CardGenerator, SemanticCache
+
+
+def prediction(topic: str) -> dspy.Prediction:
+    return dspy.Prediction(topic=topic, questions=["Q"], answers=["A"])
+
+
+class FakeEmbedder:
+    """Embedder returning fixed vectors per text and counting calls."""
+
+    def __init__(self, vectors: Dict[str, List[float]]):
+        self.vectors = vectors
+        self.calls: List[str] = []
+
+    async def acall(self, text):
+        self.calls.append(text)
+        return self.vectors[text]
+
+
+class FakePredictor:
+    """Stand-in for dspy.Predict, answering with the context as topic."""
+
+    def __init__(self):
+        self.contexts: List[str] = []
+
+    async def acall(self, context, temperature):
+        self.contexts.append(context)
+        return prediction(context)
+
+
+def angle(degrees: float) -> List[float]:
+    """A 2-d vector at the given angle, so cosine similarity is cos(angle)."""
+    radians = math.radians(degrees)
+    return [math.cos(radians), math.sin(radians)]
+
+
+# cos(18 degrees) is about 0.951 and cos(19 degrees) about 0.946,
+# either side of the default 0.95 threshold
+VECTORS = {
+    "doc": angle(0),
+    "near": angle(18),
+    "far": angle(19),
+    "other": angle(90),
+    "back": angle(180),
+}
+
+
+class TestSemanticCache:
+    """Test suite for SemanticCache."""
+
+    @pytest.fixture
+    def cache(self):
+        return SemanticCache(FakeEmbedder(VECTORS))
+
+    @pytest.mark.asyncio
+    async def test_hit_and_miss_at_threshold(self, cache):
+        """Test only contexts above the similarity threshold are hits."""
+        cached = prediction("doc")
+        cache.add(await cache.aembed("doc"), cached)
+
+        assert cache.lookup(await cache.aembed("doc")) is cached
+        assert cache.lookup(await cache.aembed("near")) is cached
+        assert cache.lookup(await cache.aembed("far")) is None
+
+    @pytest.mark.asyncio
+    async def test_empty_cache_misses(self, cache):
+        """Test a lookup before anything was added misses."""
+        assert cache.lookup(await cache.aembed("doc")) is None
+
+    @pytest.mark.asyncio
+    async def test_evicts_oldest_at_capacity(self):
+        """Test the oldest entry goes once max_entries is exceeded."""
+        cache = SemanticCache(FakeEmbedder(VECTORS), max_entries=2)
+        for text in ("doc", "other", "back"):
+            cache.add(await cache.aembed(text), prediction(text))
+
+        assert cache.lookup(await cache.aembed("other")).topic == "other"
+        assert cache.lookup(await cache.aembed("back")).topic == "back"
+        # "doc" was evicted; "near" is only close enough to it
+        assert cache.lookup(await cache.aembed("near")) is None
+
+    @pytest.mark.asyncio
+    async def test_embeds_truncated_context(self):
+        """Test only the first max_chars characters are embedded."""
+        embedder = FakeEmbedder({"do": angle(0)})
+        cache = SemanticCache(embedder, max_chars=2)
+
+        await cache.aembed("doc")
+
+        assert embedder.calls == ["do"]
+
+    @pytest.mark.asyncio
+    async def test_generator_uses_cache_for_near_duplicates(self):
+        """Test a near-duplicate context is answered from the cache."""
+        generator = CardGenerator(semantic_cache=SemanticCache(FakeEmbedder(VECTORS)))
+        generator.generate_cards = FakePredictor()
+
+        await generator.aforward("doc")
+        result = await generator.aforward("near")
+
+        assert generator.generate_cards.contexts == ["doc"]
+        assert result.topic == "doc"
+
+    @pytest.mark.asyncio
+    async def test_generator_without_cache(self):
+        """Test the cache is off by default: no embeddings, every context asked."""
+        generator = CardGenerator()
+        generator.generate_cards = FakePredictor()
+
+        await generator.aforward("doc")
+        await generator.aforward("near")
+
+        assert generator.semantic_cache is None
+        assert generator.generate_cards.contexts == ["doc", "near"]
+
+
+class FakeResponseDatabase:
+    """Stand-in for CardDatabase's llm_cache, recording every call."""
+
+    def __init__(self):
+        self.responses: Dict[str, dict] = {}
+        self.loads: List[str] = []
+        self.saves: List[str] = []
+
+    async def aload_llm_response(self, key):
+        self.loads.append(key)
+        return self.responses.get(key)
+
+    async def asave_llm_response(self, key, model, response):
+        self.saves.append(key)
+        self.responses[key] = response
+
+
+class TestPredictionCaches:
+    """Test suite for CardGenerator's in-memory and persistent caches."""
+
+    @pytest.fixture
+    def db(self):
+        return FakeResponseDatabase()
+
+    @pytest.fixture
+    def generator(self, db):
+        generator = CardGenerator(cache_size=2, db=db)
+        generator.generate_cards = FakePredictor()
+        return generator
+
+    @pytest.mark.asyncio
+    async def test_miss_saves_response(self, generator, db):
+        """Test a new context is generated and written to llm_cache."""
+        result = await generator.aforward("doc")
+
+        assert result.topic == "doc"
+        assert generator.generate_cards.contexts == ["doc"]
+        assert len(db.saves) == 1
+        assert db.responses[db.saves[0]]["topic"] == "doc"
+
+    @pytest.mark.asyncio
+    async def test_memory_hit_skips_database(self, generator, db):
+        """Test a repeated context is served without touching the database."""
+        await generator.aforward("doc")
+        loads, saves = len(db.loads), len(db.saves)
+
+        result = await generator.aforward("doc")
+
+        assert result.topic == "doc"
+        assert (len(db.loads), len(db.saves)) == (loads, saves)
+        assert generator.generate_cards.contexts == ["doc"]
+
+    @pytest.mark.asyncio
+    async def test_database_hit_fills_memory(self, db):
+        """Test a response saved by an earlier run is reused and remembered."""
+        earlier = CardGenerator(db=db)
+        earlier.generate_cards = FakePredictor()
+        await earlier.aforward("doc")
+
+        generator = CardGenerator(db=db)
+        generator.generate_cards = FakePredictor()
+        await generator.aforward("doc")
+        loads = len(db.loads)
+        result = await generator.aforward("doc")
+
+        assert result.topic == "doc"
+        assert generator.generate_cards.contexts == []
+        assert len(db.loads) == loads
+        assert len(db.saves) == 1
+
+    @pytest.mark.asyncio
+    async def test_memory_evicts_least_recently_used(self, generator, db):
+        """Test the in-memory cache keeps only cache_size contexts."""
+        await generator.aforward("doc")
+        await generator.aforward("other")
+        # Touch "doc" so "other" is the least recently used
+        await generator.aforward("doc")
+        await generator.aforward("back")
+
+        assert len(generator._cache) == 2
+        loads = len(db.loads)
+        await generator.aforward("doc")
+        await generator.aforward("back")
+        assert len(db.loads) == loads
+        await generator.aforward("other")
+        assert len(db.loads) == loads + 1
+
+    @pytest.mark.asyncio
+    async def test_cards_are_fresh_per_call(self, generator):
+        """Test cached predictions hand out new Card objects every time."""
+        first = await generator.aforward("doc")
+        second = await generator.aforward("doc")
+
+        assert first.cards[0] is not second.cards[0]
+        assert first.cards[0].context == "doc"
+
+
+class FakeBatchPredictor:
+    """Stand-in for the batched dspy.Predict, parsing the [index] prompt."""
+
+    def __init__(self, drop_one: bool = False):
+        self.prompts: List[str] = []
+        # Answer for one context too few, as a confused model might
+        self.drop_one = drop_one
+
+    async def acall(self, contexts, temperature):
+        self.prompts.append(contexts)
+        topics = [part.split("] ", 1)[1] for part in contexts.split("\n\n")]
+        if self.drop_one:
+            topics = topics[:-1]
+        return dspy.Prediction(
+            topics=topics,
+            questions=[["Q"] for _ in topics],
+            answers=[["A"] for _ in topics],
+        )
+
+
+class TestBatchForward:
+    """Test suite for CardGenerator.abatch_forward."""
+
+    @pytest.fixture
+    def db(self):
+        return FakeResponseDatabase()
+
+    @pytest.fixture
+    def generator(self, db):
+        generator = CardGenerator(db=db)
+        generator.generate_cards = FakePredictor()
+        generator.generate_cards_batch = FakeBatchPredictor()
+        return generator
+
+    @pytest.mark.asyncio
+    async def test_batches_up_to_batch_size(self, generator, db):
+        """Test misses are sent BATCH_SIZE per call, results in input order."""
+        contexts = [f"doc {i}" for i in range(BATCH_SIZE + 1)]
+
+        results = await generator.abatch_forward(contexts)
+
+        assert [result.topic for result in results] == contexts
+        assert [result.cards[0].context for result in results] == contexts
+        assert generator.generate_cards_batch.prompts == [
+            "\n\n".join(f"[{i}] doc {i}" for i in range(BATCH_SIZE))
+        ]
+        # A lone leftover context uses the single-context signature
+        assert generator.generate_cards.contexts == [f"doc {BATCH_SIZE}"]
+        assert len(db.saves) == len(contexts)
+
+    @pytest.mark.asyncio
+    async def test_cached_contexts_skip_lm(self, generator):
+        """Test only uncached contexts reach the LM, duplicates once."""
+        await generator.aforward("cached")
+
+        results = await generator.abatch_forward(["cached", "a", "b", "a"])
+
+        assert [result.topic for result in results] == ["cached", "a", "b", "a"]
+        assert generator.generate_cards_batch.prompts == ["[0] a\n\n[1] b"]
+        assert generator.generate_cards.contexts == ["cached"]
+
+    @pytest.mark.asyncio
+    async def test_results_reused_by_aforward(self, generator, db):
+        """Test batched results land in the caches aforward reads."""
+        await generator.abatch_forward(["a", "b"])
+        loads = len(db.loads)
+
+        assert (await generator.aforward("a")).topic == "a"
+        assert len(db.loads) == loads
+
+        fresh = CardGenerator(db=db)
+        fresh.generate_cards = FakePredictor()
+        assert (await fresh.aforward("b")).topic == "b"
+        assert fresh.generate_cards.contexts == []
+
+    @pytest.mark.asyncio
+    async def test_falls_back_when_model_loses_track(self, generator):
+        """Test a batch answered for the wrong number of contexts is redone singly."""
+        generator.generate_cards_batch = FakeBatchPredictor(drop_one=True)
+
+        results = await generator.abatch_forward(["a", "b"])
+
+        assert [result.topic for result in results] == ["a", "b"]
+        assert sorted(generator.generate_cards.contexts) == ["a", "b"]
@@ -1,36 +1,41 @@
 """Unit tests for anki_feedback database operations."""
+import asyncio
 import pytest
 import pytest_asyncio
-import tempfile
-import os
 from datetime import datetime, timezone
 
-from gpt_to_anki.database import CardDatabase, AnkiFeedbackRecord
+from sqlalchemy import delete, event, select, text
+
+from gpt_to_anki.database import SCHEMA_VERSION, CardDatabase, AnkiFeedbackRecord
 from gpt_to_anki.anki_models import AnkiNoteFeedback
+from gpt_to_anki.data_objects import Card
 
 
 class TestAnkiFeedbackDatabaseOperations:
     """Test suite for anki_feedback database operations."""
 
-    @pytest_asyncio.fixture
-    async def db(self):
-        """Create a temporary database for testing."""
-        with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
-            db_path = tmp.name
-        
-        db = CardDatabase(db_path)
+    @pytest_asyncio.fixture(scope="class")
+    async def shared_db(self, memory_db_path):
+        """Create one in-memory database for the whole test class."""
+        # In-memory, kept alive by the pooled connection until aclose()
+        db = CardDatabase(memory_db_path("feedback"))
         await db.ainit_database()
         yield db
         await db.aclose()
-        
-        # Cleanup
-        if os.path.exists(db_path):
-            os.unlink(db_path)
 
-    @pytest.fixture
+    @pytest_asyncio.fixture
+    async def db(self, shared_db):
+        """Hand each test the shared database with its tables emptied."""
+        async with shared_db.async_session() as session:
+            await session.execute(delete(AnkiFeedbackRecord))
+            await session.commit()
+        await shared_db.aclear_all_cards()
+        return shared_db
+
+    @pytest.fixture(scope="class")
     def sample_feedback(self):
-        """Create sample AnkiNoteFeedback objects."""
-        return [
+        """Create sample AnkiNoteFeedback objects, shared read-only by the tests."""
+        return (
             AnkiNoteFeedback(
                 database_id=1,
                 anki_note_id=10001,
@@ -64,7 +69,7 @@ class TestAnkiFeedbackDatabaseOperations:
                 suspended=False,
                 flag=2,
             ),
-        ]
+        )
 
     @pytest.mark.asyncio
     async def test_save_and_load_anki_feedback(self, db, sample_feedback):
@@ -89,16 +94,49 @@ class TestAnkiFeedbackDatabaseOperations:
             assert fb.suspended == expected.suspended
             assert fb.flag == expected.flag
 
+    @pytest.mark.asyncio
+    async def test_save_commits_once(self, db, sample_feedback):
+        """Test saving several feedback rows commits a single transaction."""
+        commits = []
+
+        def on_commit(conn):
+            commits.append(conn)
+
+        event.listen(db.engine.sync_engine, "commit", on_commit)
+        try:
+            await db.asave_anki_feedback(sample_feedback)
+        finally:
+            event.remove(db.engine.sync_engine, "commit", on_commit)
+
+        assert len(commits) == 1
+        assert len(await db.aload_anki_feedback([1, 2, 3])) == 3
+
+    @pytest.mark.asyncio
+    async def test_save_failure_raises(self, db, sample_feedback):
+        """Test a failed feedback write reaches the caller."""
+
+        def fail(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("INSERT INTO anki_feedback"):
+                raise RuntimeError("disk full")
+
+        event.listen(db.engine.sync_engine, "before_cursor_execute", fail)
+        try:
+            with pytest.raises(RuntimeError, match="disk full"):
+                await db.asave_anki_feedback(sample_feedback)
+        finally:
+            event.remove(db.engine.sync_engine, "before_cursor_execute", fail)
+
+        assert await db.aload_anki_feedback([1, 2, 3]) == []
+
     @pytest.mark.asyncio
     async def test_load_partial_feedback(self, db, sample_feedback):
         """Test loading only some feedback records."""
         await db.asave_anki_feedback(sample_feedback)
         
         # Load only specific IDs
-        loaded = await db.aload_anki_feedback([1, 3])
-        assert len(loaded) == 2
-        assert loaded[0].database_id == 1
-        assert loaded[1].database_id == 3
+        loaded = await db.aload_anki_feedback_map([1, 3])
+        assert sorted(loaded) == [1, 3]
+        assert loaded[3].question == "Question 3"
 
     @pytest.mark.asyncio
     async def test_load_nonexistent_feedback(self, db):
@@ -106,6 +144,15 @@ class TestAnkiFeedbackDatabaseOperations:
         loaded = await db.aload_anki_feedback([999, 1000])
         assert len(loaded) == 0
 
+    @pytest.mark.asyncio
+    async def test_load_feedback_many_ids(self, db, sample_feedback):
+        """Test loading with more ids than SQLite allows bound variables."""
+        await db.asave_anki_feedback(sample_feedback)
+
+        loaded = await db.aload_anki_feedback(list(range(40_000)))
+
+        assert sorted(fb.database_id for fb in loaded) == [1, 2, 3]
+
     @pytest.mark.asyncio
     async def test_empty_feedback_list(self, db):
         """Test handling empty feedback lists."""
@@ -151,11 +198,11 @@ class TestAnkiFeedbackDatabaseOperations:
         await db.asave_anki_feedback(modified_feedback)
         
         # Load and verify updates
-        loaded = await db.aload_anki_feedback([1, 2])
+        loaded = await db.aload_anki_feedback_map([1, 2])
         assert len(loaded) == 2
         
         # Check first record
-        fb1 = next(fb for fb in loaded if fb.database_id == 1)
+        fb1 = loaded[1]
         assert fb1.deck_name == "UpdatedDeck"
         assert fb1.model_name == "UpdatedModel"
         assert fb1.question == "Updated Question 1"
@@ -165,7 +212,7 @@ class TestAnkiFeedbackDatabaseOperations:
         assert fb1.flag == 3
         
         # Check second record
-        fb2 = next(fb for fb in loaded if fb.database_id == 2)
+        fb2 = loaded[2]
         assert fb2.anki_note_id == 20002
         assert fb2.question == "Updated Question 2"
         assert fb2.suspended is False
@@ -197,22 +244,34 @@ class TestAnkiFeedbackDatabaseOperations:
         await db.asave_anki_feedback(mixed_feedback)
         
         # Verify all are saved
-        loaded = await db.aload_anki_feedback([1, 2, 3])
+        loaded = await db.aload_anki_feedback_map([1, 2, 3])
         assert len(loaded) == 3
         
         # Verify update
-        fb1 = next(fb for fb in loaded if fb.database_id == 1)
+        fb1 = loaded[1]
         assert fb1.deck_name == "UpdatedDeck"
         assert fb1.question == "Updated Q1"
         assert fb1.suspended is True
 
     @pytest.mark.asyncio
-    async def test_database_not_initialized(self):
+    async def test_load_database_ids(self, db):
+        """Test loading only the card ids of a context."""
+        cards = await db.asave_cards(
+            [
+                Card(question="Q1", answer="A1", context="doc", topic="T"),
+                Card(question="Q2", answer="A2", context="other", topic="T"),
+                Card(question="Q3", answer="A3", context="doc", topic="T"),
+            ]
+        )
+
+        ids = await db.aload_database_ids("doc")
+        assert ids == [cards[0].database_id, cards[2].database_id]
+        assert await db.aload_database_ids("missing") == []
+
+    @pytest.mark.asyncio
+    async def test_database_not_initialized(self, memory_db_path):
         """Test operations on uninitialized database."""
-        with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
-            db_path = tmp.name
-        
-        db = CardDatabase(db_path)
+        db = CardDatabase(memory_db_path("uninitialized"))
         # Don't call ainit_database()
         
         feedback = [
@@ -235,7 +294,6 @@ class TestAnkiFeedbackDatabaseOperations:
         assert len(loaded) == 1
         
         await db.aclose()
-        os.unlink(db_path)
 
     @pytest.mark.asyncio
     async def test_updated_at_timestamp(self, db):
@@ -252,20 +310,93 @@ class TestAnkiFeedbackDatabaseOperations:
             flag=0,
         )
         
-        # Save and check timestamp
+        # Save and check the timestamp the upsert returns
         before_save = datetime.now(timezone.utc)
-        await db.asave_anki_feedback([feedback])
+        stamps = await db.asave_anki_feedback([feedback])
         
-        # Query directly to check timestamp
+        assert list(stamps) == [1]
+        # Stored as Unix milliseconds
+        record_utc = datetime.fromtimestamp(stamps[1] / 1000, timezone.utc)
+        # Allow for up to 1 second difference due to database timestamp precision
+        time_diff = abs((record_utc - before_save).total_seconds())
+        assert time_diff < 1.0, f"Timestamp difference too large: {time_diff}s"
+
+        # Saving again, a few milliseconds later, moves the stamp forward
+        await asyncio.sleep(0.005)
+        stamps_again = await db.asave_anki_feedback([feedback])
+        assert stamps_again[1] > stamps[1]
+
+    @pytest.mark.asyncio
+    async def test_updated_at_datetime_text_migrated(self, memory_db_path):
+        """Test datetime text left by the old column type becomes milliseconds."""
+        db = CardDatabase(memory_db_path("migrate"))
+        # anki_feedback as created while updated_at was a DateTime column
+        async with db.engine.begin() as conn:
+            await conn.execute(
+                text(
+                    "CREATE TABLE anki_feedback ("
+                    "id INTEGER PRIMARY KEY, database_id INTEGER NOT NULL UNIQUE, "
+                    "anki_note_id INTEGER NOT NULL, deck_name VARCHAR NOT NULL, "
+                    "model_name VARCHAR NOT NULL, question VARCHAR NOT NULL, "
+                    "answer VARCHAR NOT NULL, topic VARCHAR, "
+                    "suspended BOOLEAN NOT NULL, flag INTEGER NOT NULL, "
+                    "updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP))"
+                )
+            )
+            await conn.execute(
+                text(
+                    "INSERT INTO anki_feedback VALUES "
+                    "(1, 1, 10001, 'D', 'M', 'Q', 'A', 'T', 0, 0, "
+                    "'2024-01-02 03:04:05.250000')"
+                )
+            )
+
+        await db.ainit_database()
+
         async with db.async_session() as session:
-            from sqlalchemy import select
-            stmt = select(AnkiFeedbackRecord).where(AnkiFeedbackRecord.database_id == 1)
-            result = await session.execute(stmt)
-            record = result.scalar_one()
-            
-            assert record.updated_at is not None
-            # Convert naive datetime to UTC for comparison and allow for precision loss
-            record_utc = record.updated_at.replace(tzinfo=timezone.utc)
-            # Allow for up to 1 second difference due to database timestamp precision
-            time_diff = abs((record_utc - before_save).total_seconds())
-            assert time_diff < 1.0, f"Timestamp difference too large: {time_diff}s"
\ No newline at end of file
+            result = await session.execute(select(AnkiFeedbackRecord.updated_at))
+            updated_at = result.scalar_one()
+        expected = datetime(2024, 1, 2, 3, 4, 5, 250000, timezone.utc)
+        assert updated_at == int(expected.timestamp() * 1000)
+
+        # Converted rows keep working with the upsert
+        stamps = await db.asave_anki_feedback(
+            [
+                AnkiNoteFeedback(
+                    database_id=1,
+                    anki_note_id=10001,
+                    deck_name="D",
+                    model_name="M",
+                    question="Q",
+                    answer="A",
+                )
+            ]
+        )
+        assert stamps[1] > updated_at
+
+        await db.aclose()
+
+    @pytest.mark.asyncio
+    async def test_migration_runs_once(self, memory_db_path):
+        """Test a database already at SCHEMA_VERSION skips the migration."""
+        path = memory_db_path("migrate_once")
+        first = CardDatabase(path)
+        await first.ainit_database()
+        async with first.engine.connect() as conn:
+            version = (await conn.execute(text("PRAGMA user_version"))).scalar_one()
+        assert version == SCHEMA_VERSION
+
+        # A second start on the same database, kept alive by the first engine
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        second = CardDatabase(path)
+        event.listen(second.engine.sync_engine, "before_cursor_execute", record)
+        await second.ainit_database()
+
+        assert not any(s.startswith("UPDATE anki_feedback") for s in statements)
+
+        await second.aclose()
+        await first.aclose()
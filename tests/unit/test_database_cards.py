@@ -0,0 +1,178 @@
+"""Unit tests for card database operations."""
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+
+from gpt_to_anki.database import CardDatabase
+from gpt_to_anki.data_objects import Card
+
+
+class TestCardDatabaseOperations:
+    """Test suite for card database operations."""
+
+    @pytest_asyncio.fixture
+    async def db(self, memory_db_path):
+        """Create an in-memory database for testing."""
+        # In-memory, kept alive by the pooled connection until aclose()
+        db = CardDatabase(memory_db_path("cards"))
+        await db.ainit_database()
+        yield db
+        await db.aclose()
+
+    @pytest.mark.asyncio
+    async def test_save_new_cards(self, db):
+        """Test new cards get database ids in input order."""
+        cards = [
+            Card(question=f"Q{i}", answer=f"A{i}", context="doc", topic="T")
+            for i in range(3)
+        ]
+
+        saved = await db.asave_cards(cards)
+
+        assert [card.question for card in saved] == ["Q0", "Q1", "Q2"]
+        assert all(card.database_id is not None for card in saved)
+        assert cards[0].database_id is None  # Inputs are not mutated
+
+        loaded = await db.aload_cards("doc")
+        assert [(c.database_id, c.question) for c in loaded] == [
+            (c.database_id, c.question) for c in saved
+        ]
+
+    @pytest.mark.asyncio
+    async def test_save_mixed_cards(self, db):
+        """Test updating existing cards alongside inserting new ones."""
+        first, second = await db.asave_cards(
+            [
+                Card(question="Q1", answer="A1", context="doc", topic="T"),
+                Card(question="Q2", answer="A2", context="doc", topic="T"),
+            ]
+        )
+        first.evaluation = "liked"
+
+        saved = await db.asave_cards(
+            [
+                Card(question="Q3", answer="A3", context="doc", topic="T"),
+                first,
+                second,  # Unchanged
+            ]
+        )
+
+        assert saved[1].database_id == first.database_id
+        assert saved[2].database_id == second.database_id
+        assert saved[0].database_id not in (first.database_id, second.database_id)
+
+        loaded = {card.question: card for card in await db.aload_cards("doc")}
+        assert len(loaded) == 3
+        assert loaded["Q1"].evaluation == "liked"
+        assert loaded["Q2"].evaluation == "not_evaluated"
+
+    @pytest.mark.asyncio
+    async def test_update_card_evaluations(self, db):
+        """Test setting several evaluations by database id at once."""
+        first, second, third = await db.asave_cards(
+            [
+                Card(question=f"Q{i}", answer=f"A{i}", context="doc", topic="T")
+                for i in range(3)
+            ]
+        )
+
+        await db.aupdate_card_evaluations(
+            {first.database_id: "liked", third.database_id: "seen"}
+        )
+
+        loaded = await db.aload_cards("doc")
+        assert [card.evaluation for card in loaded] == [
+            "liked",
+            "not_evaluated",
+            "seen",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_session_scope(self, db):
+        """Test calls inside a session scope share one transaction."""
+        async with db.session_scope():
+            saved = await db.asave_cards(
+                [Card(question="Q1", answer="A1", context="doc", topic="T")]
+            )
+            # Visible inside the scope before it commits
+            assert [c.database_id for c in await db.aload_cards("doc")] == [
+                saved[0].database_id
+            ]
+
+        assert len(await db.aload_cards("doc")) == 1
+
+        with pytest.raises(RuntimeError):
+            async with db.session_scope():
+                await db.asave_cards(
+                    [Card(question="Q2", answer="A2", context="doc", topic="T")]
+                )
+                raise RuntimeError("abort")
+
+        # The failed scope was rolled back as a whole
+        assert [c.question for c in await db.aload_cards("doc")] == ["Q1"]
+
+    @pytest.mark.asyncio
+    async def test_get_contexts_cache(self, db):
+        """Test the cached context list follows saves and deletes."""
+        assert await db.aget_contexts() == []
+
+        await db.asave_cards([Card(question="Q", answer="A", context="b", topic="T")])
+        await db.asave_cards([Card(question="Q", answer="A", context="a", topic="T")])
+        assert await db.aget_contexts() == ["a", "b"]
+        assert await db.aget_contexts() == ["a", "b"]
+
+        await db.adelete_context("a")
+        assert await db.aget_contexts() == ["b"]
+
+        await db.aclear_all_cards()
+        assert await db.aget_contexts() == []
+
+    @pytest.mark.asyncio
+    async def test_get_contexts_not_cached_across_write(self, db):
+        """Test a read overlapping a committed write does not cache its rows."""
+
+        def write_commits(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("SELECT DISTINCT"):
+                # A write commits while the read is in flight
+                db._invalidate_contexts()
+
+        event.listen(db.engine.sync_engine, "after_cursor_execute", write_commits)
+        try:
+            assert await db.aget_contexts() == []
+        finally:
+            event.remove(db.engine.sync_engine, "after_cursor_execute", write_commits)
+
+        assert db._contexts_cache is None
+        await db.asave_cards([Card(question="Q", answer="A", context="a", topic="T")])
+        assert await db.aget_contexts() == ["a"]
+
+    @pytest.mark.asyncio
+    async def test_save_many_contexts(self, db):
+        """Test saving cards of several contexts in one call."""
+        saved = await db.asave_many_contexts(
+            {
+                "a": [
+                    Card(question="Qa1", answer="A", topic="T"),
+                    Card(question="Qa2", answer="A", topic="T"),
+                ],
+                "b": [Card(question="Qb1", answer="A", topic="T")],
+                "c": [],
+            }
+        )
+
+        assert list(saved) == ["a", "b", "c"]
+        assert [card.question for card in saved["a"]] == ["Qa1", "Qa2"]
+        assert saved["c"] == []
+        for context in ("a", "b"):
+            loaded = await db.aload_cards(context)
+            assert [(c.database_id, c.context) for c in loaded] == [
+                (c.database_id, context) for c in saved[context]
+            ]
+
+    @pytest.mark.asyncio
+    async def test_save_no_cards(self, db):
+        """Test saving an empty list returns without touching the database."""
+        db.async_session = None  # Any session use would fail
+
+        assert await db.asave_cards([]) == []
+        assert await db.asave_many_contexts({}) == {}
@@ -0,0 +1,48 @@
+"""Unit tests for the llm_cache database operations."""
+import pytest
+import pytest_asyncio
+
+from sqlalchemy import select
+
+from gpt_to_anki.database import CardDatabase, LLMCacheRecord
+
+
+class TestLLMCacheDatabaseOperations:
+    """Test suite for llm_cache database operations."""
+
+    @pytest_asyncio.fixture
+    async def db(self, memory_db_path):
+        """Create an in-memory database for testing."""
+        # In-memory, kept alive by the pooled connection until aclose()
+        db = CardDatabase(memory_db_path("llm_cache"))
+        await db.ainit_database()
+        yield db
+        await db.aclose()
+
+    @pytest.mark.asyncio
+    async def test_save_and_load_llm_response(self, db):
+        """Test a cached response round-trips through compression."""
+        response = {
+            "topic": "Python",
+            "questions": ["What is Python?"] * 10,
+            "answers": ["A programming language"] * 10,
+        }
+        await db.asave_llm_response("key1", "gpt-4o-mini", response)
+
+        assert await db.aload_llm_response("key1") == response
+        assert await db.aload_llm_response("missing") is None
+
+        # Stored compressed, not as plain JSON
+        async with db.async_session() as session:
+            result = await session.execute(select(LLMCacheRecord))
+            record = result.scalar_one()
+            assert record.model == "gpt-4o-mini"
+            assert b"What is Python?" not in record.response
+
+    @pytest.mark.asyncio
+    async def test_save_llm_response_keeps_first(self, db):
+        """Test saving an existing key keeps the cached response."""
+        await db.asave_llm_response("key1", "gpt-4o-mini", {"topic": "First"})
+        await db.asave_llm_response("key1", "gpt-4o-mini", {"topic": "Second"})
+
+        assert await db.aload_llm_response("key1") == {"topic": "First"}
@@ -0,0 +1,111 @@
+"""Unit tests for PDF text extraction."""
+import io
+import os
+import tempfile
+
+import pytest
+from pypdf import PdfWriter
+from pypdf.generic import (
+    DecodedStreamObject,
+    DictionaryObject,
+    NameObject,
+)
+
+from gpt_to_anki import pdf_text
+from gpt_to_anki.pdf_text import (
+    PDF_PAGES_PER_TASK,
+    extract_pdf_text,
+    shutdown_pdf_pool,
+)
+
+
+def make_pdf(page_count: int) -> bytes:
+    """Build a PDF whose page i holds the text 'Page i'."""
+    writer = PdfWriter()
+    font = DictionaryObject(
+        {
+            NameObject("/Type"): NameObject("/Font"),
+            NameObject("/Subtype"): NameObject("/Type1"),
+            NameObject("/BaseFont"): NameObject("/Helvetica"),
+        }
+    )
+    for i in range(page_count):
+        page = writer.add_blank_page(200, 200)
+        page[NameObject("/Resources")] = DictionaryObject(
+            {
+                NameObject("/Font"): DictionaryObject(
+                    {NameObject("/F1"): writer._add_object(font)}
+                )
+            }
+        )
+        content = DecodedStreamObject()
+        content.set_data(f"BT /F1 12 Tf 20 100 Td (Page {i}) Tj ET".encode())
+        page[NameObject("/Contents")] = writer._add_object(content)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+class TestExtractPdfText:
+    """Test suite for extract_pdf_text."""
+
+    @pytest.fixture(scope="class", autouse=True)
+    def stop_pool(self):
+        """Stop the worker processes the tests started."""
+        yield
+        shutdown_pdf_pool()
+
+    @pytest.fixture(scope="class")
+    def large_pdf(self, tmp_path_factory):
+        """A PDF spread over several page blocks, as bytes and as a file."""
+        data = make_pdf(2 * PDF_PAGES_PER_TASK + 5)
+        path = tmp_path_factory.mktemp("pdf") / "large.pdf"
+        path.write_bytes(data)
+        return data, str(path)
+
+    def test_small_pdf_stays_in_process(self, monkeypatch):
+        """Test a PDF of one page block is read without the process pool."""
+
+        def no_pool():
+            raise AssertionError("process pool used for a small PDF")
+
+        monkeypatch.setattr(pdf_text, "_get_pool", no_pool)
+
+        text = extract_pdf_text(make_pdf(3))
+
+        assert text.splitlines() == ["Page 0", "Page 1", "Page 2"]
+
+    def test_page_order_across_blocks(self, large_pdf):
+        """Test pages come back in order when blocks go to several workers."""
+        _, path = large_pdf
+
+        text = extract_pdf_text(path)
+
+        expected = [f"Page {i}" for i in range(2 * PDF_PAGES_PER_TASK + 5)]
+        assert text.splitlines() == expected
+
+    def test_bytes_and_path_match(self, large_pdf, monkeypatch, tmp_path):
+        """Test bytes input gives the path result and cleans up its file."""
+        data, path = large_pdf
+        # The temporary copy of the bytes goes to a directory we can watch
+        monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+
+        assert extract_pdf_text(data) == extract_pdf_text(path)
+        assert os.listdir(tmp_path) == []
+
+    def test_pool_shutdown(self, large_pdf):
+        """Test shutting the pool down lets the next extraction start another."""
+        _, path = large_pdf
+        extract_pdf_text(path)
+        pool = pdf_text._POOL
+        assert pool is not None
+
+        shutdown_pdf_pool()
+
+        assert pdf_text._POOL is None
+        with pytest.raises(RuntimeError):
+            pool.submit(len, "")
+        # A later extraction starts a fresh pool
+        assert extract_pdf_text(path).startswith("Page 0")
+        assert pdf_text._POOL is not None
+        assert pdf_text._POOL is not pool